@@ -0,0 +1,12 @@
+#version 330 core
+
+in vec2 v_local;
+
+out vec4 f_color;
+
+void main() {
+    // exact circle: the pixels whose center is outside it are dropped
+    if (dot(v_local, v_local) > 1.0)
+        discard;
+    f_color = vec4(1.0, 1.0, 1.0, 1.0);
+}
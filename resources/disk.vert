@@ -0,0 +1,21 @@
+#version 330 core
+
+uniform mat4 u_projectionMatrix;
+
+in vec2 in_vert;
+
+// per instance
+in vec2 in_pos;
+in float in_angle;
+in float in_scale;
+
+out vec2 v_local;
+
+void main() {
+    // same as shape.vert, in_vert spans the square around the unit circle
+    float c = cos(in_angle);
+    float s = sin(in_angle);
+    vec2 p = mat2(c, s, -s, c) * in_vert * in_scale + in_pos;
+    v_local = in_vert;
+    gl_Position = u_projectionMatrix * vec4(p, 0.0, 1.0);
+}
@@ -0,0 +1,11 @@
+#version 330 core
+
+uniform vec3 u_color;
+
+in float v_alpha;
+
+out vec4 f_color;
+
+void main() {
+    f_color = vec4(u_color, v_alpha);
+}
@@ -0,0 +1,20 @@
+#version 330 core
+
+uniform mat4 u_projectionMatrix;
+uniform float u_size;
+
+in vec2 in_pos;
+in float in_lifetime;
+
+out float v_alpha;
+
+void main() {
+    v_alpha = clamp(in_lifetime, 0.0, 1.0);
+    gl_Position = u_projectionMatrix * vec4(in_pos, 0.0, 1.0);
+    gl_PointSize = u_size;
+
+    // dead particle, push it out of the clip space
+    if (in_lifetime <= 0.0) {
+        gl_Position = vec4(2.0, 2.0, 2.0, 1.0);
+    }
+}
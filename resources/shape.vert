@@ -1,10 +1,18 @@
 #version 330 core
 
 uniform mat4 u_projectionMatrix;
-uniform mat4 u_modelMatrix;
 
 in vec2 in_vert;
 
+// per instance
+in vec2 in_pos;
+in float in_angle;
+in float in_scale;
+
 void main() {
-    gl_Position = u_projectionMatrix * u_modelMatrix * vec4(in_vert, 0.0, 1.0);
+    // same as toMatrix(): translate * scale * rotate
+    float c = cos(in_angle);
+    float s = sin(in_angle);
+    vec2 p = mat2(c, s, -s, c) * in_vert * in_scale + in_pos;
+    gl_Position = u_projectionMatrix * vec4(p, 0.0, 1.0);
 }
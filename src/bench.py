@@ -0,0 +1,244 @@
+#! /usr/bin/python3
+
+## Benchmarks of the simulation and rendering hot paths.
+##   python src/bench.py                      # print results as json lines
+##   python src/bench.py -o new.jsonl --compare old.jsonl
+## Rendering stages need an offscreen gl context (ARCADE_HEADLESS=1), they are skipped without one.
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from simulation import Simulation, STATE_PLAYING
+from shapefield import ShapeField
+from particles import ParticleSystem
+from player import Player, INPUT_UP, INPUT_RIGHT, INPUT_DASH
+from collision import is_lit
+from timestep import TICK_RATE
+from utils import toMatrix
+
+WIDTH = 1280
+HEIGHT = 720
+DT = 1/60
+
+SHAPE_COUNTS = (10, 100, 1000, 10000)
+PARTICLE_COUNTS = (100, 1000, 10000, 100000)
+
+def measure(stage, n, func, calls, repeats=5):
+    ## best of `repeats` batches of `calls` calls, then one traced batch for allocations
+    func()
+    timings = []
+    for _ in range(repeats):
+        t = time.perf_counter()
+        for _ in range(calls):
+            func()
+        timings.append((time.perf_counter() - t) / calls)
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    for _ in range(calls):
+        func()
+    after = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    stats = after.compare_to(before, 'filename')
+    allocated = sum(max(0, s.size_diff) for s in stats)
+    blocks = sum(max(0, s.count_diff) for s in stats)
+
+    timings.sort()
+    return {
+        "stage": stage,
+        "n": n,
+        "calls": calls,
+        "best_us": timings[0] * 1e6,
+        "median_us": timings[len(timings) // 2] * 1e6,
+        "retained_bytes_per_call": allocated / calls,
+        "retained_blocks_per_call": blocks / calls,
+        "peak_bytes": peak,
+    }
+
+def calls_for(n, budget=2e6):
+    ## keep each batch around the same amount of work
+    return int(max(5, min(2000, budget // max(n, 1))))
+
+def shape_field(n, seed=0):
+    shapes = ShapeField(WIDTH, HEIGHT, capacity=n, rng=np.random.default_rng(seed))
+    shapes.spawn(n)
+    return shapes
+
+def particle_system(n, seed=0):
+    particles = ParticleSystem(capacity=n, rng=np.random.default_rng(seed))
+    rng = np.random.default_rng(seed)
+    particles.spawn_many(rng.uniform(0, WIDTH, n), rng.uniform(0, HEIGHT, n))
+    return particles
+
+def bench_shapes():
+    for n in SHAPE_COUNTS:
+        calls = calls_for(n)
+        shapes = shape_field(n)
+        yield measure("shapes.advance", n, lambda: shapes.advance(DT), calls)
+
+        ## nothing to cull: measures the deadline check only
+        yield measure("shapes.cull", n, shapes.cull, calls)
+
+        yield measure("collision.is_lit", n, lambda: is_lit(WIDTH/2, HEIGHT/2, shapes), calls)
+
+        def spawn_and_clear():
+            shapes.clear()
+            shapes.spawn(n)
+        yield measure("shapes.spawn", n, spawn_and_clear, max(5, calls // 10))
+
+        ## per shape Mat4 the renderer used to build in python
+        if n > 1000: continue
+        def to_matrix():
+            x, y, angle, scale = shapes.x, shapes.y, shapes.angle, shapes.scale
+            for i in range(n):
+                toMatrix(x=float(x[i]), y=float(y[i]), angle=float(angle[i]), scale=float(scale[i]))
+        yield measure("utils.toMatrix", n, to_matrix, 5)
+
+def bench_particles():
+    for n in PARTICLE_COUNTS:
+        calls = calls_for(n)
+        particles = particle_system(n)
+
+        def update():
+            particles.update(DT)
+            particles.data[:, 2] = 1.0 ## keep every particle alive
+        yield measure("particles.update", n, update, calls)
+
+        ## a tenth of the buffer per call
+        xs = np.zeros(n // 10)
+        yield measure("particles.spawn_many", len(xs), lambda: particles.spawn_many(xs, xs), calls)
+
+def bench_player():
+    player = Player(WIDTH/2, HEIGHT/2)
+    player.set_inputs(INPUT_UP | INPUT_RIGHT | INPUT_DASH)
+    yield measure("player.update", 1, lambda: player.update(DT), 2000)
+
+def bench_survival(minutes=(1, 5)):
+    ## long runs where max_shapes ramps up, the player can't die
+    for duration in minutes:
+        dt = 1 / TICK_RATE
+        sim = Simulation(WIDTH, HEIGHT, seed=0)
+        sim.step(dt, INPUT_DASH)
+        ticks = int(duration * 60 / dt)
+
+        def run():
+            for i in range(ticks):
+                sim.step(dt, INPUT_RIGHT if (i // TICK_RATE) % 2 else INPUT_UP)
+                sim.game_state = STATE_PLAYING
+                sim.player.x, sim.player.y = WIDTH/2, HEIGHT/2
+
+        t = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - t
+        yield {
+            "stage": "simulation.step",
+            "n": ticks,
+            "calls": ticks,
+            "best_us": elapsed / ticks * 1e6,
+            "median_us": elapsed / ticks * 1e6,
+            "max_shapes": sim.max_shapes,
+            "live_shapes": len(sim.shapes),
+        }
+
+def headless_window():
+    os.environ.setdefault("ARCADE_HEADLESS", "1")
+    try:
+        import arcade
+        return arcade.Window(WIDTH, HEIGHT, "bench", visible=False)
+    except Exception as e:
+        print("no offscreen gl context, skipping rendering: {}".format(e), file=sys.stderr)
+        return None
+
+def bench_render():
+    window = headless_window()
+    if window is None: return
+
+    from pyglet.math import Mat4
+    from renderer import ShapeRenderer, ParticleRenderer
+
+    ctx = window.ctx
+    projection = Mat4.orthogonal_projection(0, WIDTH, 0, HEIGHT, -1, 1)
+
+    shape_renderer = ShapeRenderer(ctx)
+    for n in SHAPE_COUNTS:
+        shapes = shape_field(n)
+
+        def render_shapes():
+            shape_renderer.upload(shapes)
+            shape_renderer.render(projection)
+            ctx.finish()
+        yield measure("render_shapes", n, render_shapes, 20, repeats=3)
+
+    for n in PARTICLE_COUNTS:
+        particles = particle_system(n)
+        particle_renderer = ParticleRenderer(ctx, n)
+
+        def render_particles():
+            particle_renderer.render(particles, projection)
+            ctx.finish()
+        yield measure("render_particles", n, render_particles, 20, repeats=3)
+
+    window.close()
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+def compare(results, path):
+    with open(path) as f:
+        old = {(r["stage"], r["n"]): r for r in map(json.loads, f) if "stage" in r}
+
+    print("{:<24} {:>7} {:>12} {:>12} {:>8}".format("stage", "n", "old us", "new us", "ratio"))
+    for r in results:
+        o = old.get((r["stage"], r["n"]))
+        if o is None: continue
+        print("{:<24} {:>7} {:>12.2f} {:>12.2f} {:>7.2f}x".format(
+            r["stage"], r["n"], o["best_us"], r["best_us"], r["best_us"] / o["best_us"]))
+
+def main():
+    parser = argparse.ArgumentParser(description="Light is death benchmarks")
+    parser.add_argument("-o", "--output", help="write json lines to this file instead of stdout")
+    parser.add_argument("--compare", help="json lines file from another run to compare with")
+    parser.add_argument("--no-render", action="store_true", help="skip rendering stages")
+    args = parser.parse_args()
+
+    suites = [bench_shapes, bench_particles, bench_player, bench_survival]
+    if not args.no_render:
+        suites.append(bench_render)
+
+    out = open(args.output, "w") if args.output else sys.stdout
+    header = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+    }
+    print(json.dumps(header), file=out, flush=True)
+
+    results = []
+    for suite in suites:
+        for result in suite():
+            results.append(result)
+            print(json.dumps(result), file=out, flush=True)
+
+    if out is not sys.stdout:
+        out.close()
+
+    if args.compare:
+        compare(results, args.compare)
+
+if __name__ == "__main__":
+    main()
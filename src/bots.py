@@ -0,0 +1,245 @@
+#! /usr/bin/python3
+
+## Programmatic players and a batch runner of headless, seeded episodes.
+##   python src/bots.py --episodes 2000 --bot dodge            # survival time distribution
+##   python src/bots.py --bot dodge --set max_shapes=5 --set speed_range=35,200
+## A bot answers the same INPUT_* flags as the keyboard, every episode can be recorded and replayed.
+
+import argparse
+import json
+import math
+import os
+import time
+from multiprocessing import Pool
+
+import numpy as np
+
+from simulation import Simulation, STATE_PLAYING
+from player import INPUT_UP, INPUT_DOWN, INPUT_LEFT, INPUT_RIGHT, INPUT_DASH
+from collision import shapes_containing
+from timestep import TICK_RATE
+
+WIDTH = 1280
+HEIGHT = 720
+
+## Difficulty knobs, on the Simulation or its ShapeField
+DIFFICULTY = {
+    'max_shapes': ('sim', int),
+    'max_time_next_shape': ('sim', float),
+    'max_cooldown_increase_max_shapes': ('sim', float),
+    'speed_range': ('shapes', lambda s: tuple(float(v) for v in s.split(','))),
+    'scale_range': ('shapes', lambda s: tuple(float(v) for v in s.split(','))),
+}
+
+def configure(sim, params):
+    ## params: {knob: value}, see DIFFICULTY
+    for name, value in params.items():
+        if name not in DIFFICULTY:
+            raise KeyError("unknown difficulty parameter: {}".format(name))
+        owner = sim if DIFFICULTY[name][0] == 'sim' else sim.shapes
+        setattr(owner, name, value)
+    sim.time_next_shape = sim.max_time_next_shape
+
+## Bots
+
+class Bot:
+    ## act() is called every step with the simulation and returns the INPUT_* flags
+    def reset(self, sim):
+        pass
+
+    def act(self, sim):
+        return 0
+
+class RandomBot(Bot):
+    ## holds a random direction for a random time, dashes now and then
+    def reset(self, sim):
+        self.rng = np.random.default_rng(sim.seed + 1)
+        self.inputs = 0
+        self.ticks_left = 0
+
+    def act(self, sim):
+        if self.ticks_left <= 0:
+            self.inputs = int(self.rng.integers(0, INPUT_DASH))
+            if self.rng.random() < 0.1:
+                self.inputs |= INPUT_DASH
+            self.ticks_left = int(self.rng.integers(TICK_RATE // 4, TICK_RATE))
+        self.ticks_left -= 1
+        return self.inputs
+
+## the 8 directions + staying still, as (inputs, dx, dy)
+MOVES = [(0, 0.0, 0.0)]
+for _inputs, _dx, _dy in ((INPUT_UP, 0, 1), (INPUT_DOWN, 0, -1), (INPUT_LEFT, -1, 0), (INPUT_RIGHT, 1, 0)):
+    MOVES.append((_inputs, float(_dx), float(_dy)))
+for _v in (INPUT_UP, INPUT_DOWN):
+    for _h in (INPUT_LEFT, INPUT_RIGHT):
+        _dx = -1.0 if _h == INPUT_LEFT else 1.0
+        _dy = 1.0 if _v == INPUT_UP else -1.0
+        MOVES.append((_v | _h, _dx / math.sqrt(2), _dy / math.sqrt(2)))
+
+class DodgeBot(Bot):
+    ## looks `ahead` seconds into the future for each move and takes a safe one,
+    ## staying away from the borders. Dashes through when no move is safe.
+    def __init__(self, ahead=0.3, think_every=4):
+        self.ahead = ahead
+        self.think_every = think_every
+
+    def reset(self, sim):
+        self.inputs = 0
+        self.tick = 0
+
+    def lit_at(self, sim, px, py, ahead):
+        parity = False
+        for overlay in sim.overlays:
+            if overlay.contains(px, py):
+                parity = not parity
+        if np.count_nonzero(shapes_containing(sim.shapes, px, py, ahead=ahead)) % 2 == 1:
+            parity = not parity
+        return parity
+
+    def act(self, sim):
+        self.tick += 1
+        if self.tick % self.think_every != 1 and not (self.inputs & INPUT_DASH):
+            return self.inputs
+
+        player = sim.player
+        reach = player.speed * self.ahead
+        margin = player.scale * 2
+
+        best, best_score = 0, -math.inf
+        for inputs, dx, dy in MOVES:
+            px = player.x + dx * reach
+            py = player.y + dy * reach
+            if not (margin < px < sim.width - margin and margin < py < sim.height - margin):
+                continue
+
+            ## safe now, half way and at the end of the look ahead
+            score = 0.0
+            for t in (self.ahead / 4, self.ahead / 2, self.ahead):
+                k = t / self.ahead
+                if self.lit_at(sim, player.x + dx * reach * k, player.y + dy * reach * k, t):
+                    score -= 10.0 / k
+            ## prefer the middle of the screen
+            score -= abs(px - sim.width / 2) / sim.width + abs(py - sim.height / 2) / sim.height
+            if score > best_score:
+                best, best_score = inputs, score
+
+        if best_score < -1.0 and best != 0 and player.dash_cooldown <= 0:
+            best |= INPUT_DASH
+        self.inputs = best
+        return best
+
+BOTS = {
+    'idle': Bot,
+    'random': RandomBot,
+    'dodge': DodgeBot,
+}
+
+## Episodes
+
+def run_episode(seed, bot, params=None, max_time=300.0, width=WIDTH, height=HEIGHT):
+    ## plays one game until game over or max_time seconds, returns the survival time and ticks
+    sim = Simulation(width, height, seed=seed)
+    if params:
+        configure(sim, params)
+    dt = 1.0 / TICK_RATE
+
+    sim.step(dt, INPUT_DASH) ## leaves the start screen
+    sim.step(dt, 0)
+    bot.reset(sim)
+
+    max_ticks = int(max_time * TICK_RATE)
+    while sim.game_state == STATE_PLAYING and sim.ticks < max_ticks:
+        sim.step(dt, bot.act(sim))
+
+    return sim.time_since_start, sim.ticks
+
+def _run_job(job):
+    seed, bot_name, params, max_time = job
+    score, ticks = run_episode(seed, BOTS[bot_name](), params, max_time)
+    return seed, score, ticks
+
+def run_batch(episodes, bot_name='dodge', params=None, seed=0, max_time=300.0, workers=None):
+    ## runs episodes with seeds seed, seed+1, ... on a process pool, returns the scores in seed order
+    jobs = [(seed + i, bot_name, params or {}, max_time) for i in range(episodes)]
+    workers = workers or os.cpu_count() or 1
+
+    if workers == 1:
+        results = [_run_job(job) for job in jobs]
+    else:
+        with Pool(workers) as pool:
+            results = pool.map(_run_job, jobs, chunksize=max(1, episodes // (workers * 8)))
+
+    results.sort()
+    return np.array([score for _, score, _ in results]), sum(ticks for _, _, ticks in results)
+
+def summary(scores):
+    ## survival time distribution, in seconds
+    if len(scores) == 0:
+        return {'episodes': 0}
+    p10, p25, p50, p75, p90, p99 = np.percentile(scores, (10, 25, 50, 75, 90, 99))
+    return {
+        'episodes': len(scores),
+        'mean': float(scores.mean()),
+        'std': float(scores.std()),
+        'min': float(scores.min()),
+        'p10': float(p10),
+        'p25': float(p25),
+        'p50': float(p50),
+        'p75': float(p75),
+        'p90': float(p90),
+        'p99': float(p99),
+        'max': float(scores.max()),
+    }
+
+def histogram(scores, bins=12, width=40):
+    counts, edges = np.histogram(scores, bins=bins)
+    lines = []
+    for count, low, high in zip(counts, edges, edges[1:]):
+        bar = "#" * int(round(count / max(counts.max(), 1) * width))
+        lines.append("{:7.1f}s - {:7.1f}s {:6d} {}".format(low, high, count, bar))
+    return lines
+
+def parse_params(assignments):
+    params = {}
+    for assignment in assignments:
+        name, _, value = assignment.partition('=')
+        if name not in DIFFICULTY:
+            raise SystemExit("unknown difficulty parameter: {} (one of {})".format(name, ", ".join(DIFFICULTY)))
+        params[name] = DIFFICULTY[name][1](value)
+    return params
+
+def main():
+    parser = argparse.ArgumentParser(description="Light is death headless bots")
+    parser.add_argument("--bot", choices=sorted(BOTS), default='dodge')
+    parser.add_argument("--episodes", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first episode, the others follow")
+    parser.add_argument("--max-time", type=float, default=300.0, help="episodes stop after this many seconds of game time")
+    parser.add_argument("--workers", type=int, default=None, help="processes (default: every cpu)")
+    parser.add_argument("--set", action="append", default=[], metavar="NAME=VALUE",
+        help="difficulty parameter: " + ", ".join(DIFFICULTY))
+    parser.add_argument("--json", action="store_true", help="print the summary as json")
+    args = parser.parse_args()
+
+    params = parse_params(args.set)
+
+    t = time.perf_counter()
+    scores, ticks = run_batch(args.episodes, args.bot, params, args.seed, args.max_time, args.workers)
+    elapsed = time.perf_counter() - t
+
+    stats = summary(scores)
+    stats.update({'bot': args.bot, 'params': params, 'seconds': elapsed, 'ticks': ticks})
+    if args.json:
+        print(json.dumps(stats))
+        return
+
+    print("{} x {} episodes in {:.1f}s ({:.0f} episodes/min, {:.0f} ticks/s)".format(
+        args.bot, stats['episodes'], elapsed, stats['episodes'] / elapsed * 60, ticks / elapsed))
+    if params:
+        print("params: " + ", ".join("{}={}".format(k, v) for k, v in params.items()))
+    print("survival: mean {mean:.2f}s  std {std:.2f}s  min {min:.2f}s  max {max:.2f}s".format(**stats))
+    print("          p10 {p10:.2f}s  p25 {p25:.2f}s  p50 {p50:.2f}s  p75 {p75:.2f}s  p90 {p90:.2f}s  p99 {p99:.2f}s".format(**stats))
+    for line in histogram(scores):
+        print(line)
+
+if __name__ == "__main__":
+    main()
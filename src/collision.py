@@ -0,0 +1,77 @@
+import numpy as np
+from math import floor
+from shapefield import SHAPE_QUAD
+
+## Analytic version of the framebuffer test: shapes are drawn with GL_INVERT
+## on top of white text, so a point is lit when it is covered by an odd
+## number of shapes and overlays.
+
+def shapes_containing(shapes, px, py, slots=slice(None), ahead=0.0):
+    ## mask over `slots` of the live shapes of a ShapeField covering the point,
+    ## `ahead` seconds from now if they keep moving
+    dx = px - shapes.x[slots]
+    dy = py - shapes.y[slots]
+    if ahead:
+        dx -= shapes.vel[slots, 0] * ahead
+        dy -= shapes.vel[slots, 1] * ahead
+    scale = shapes.scale[slots]
+
+    inside = shape_contains(dx, dy, shapes.rot[slots, 0], shapes.rot[slots, 1], scale, shapes.kind[slots])
+    return shapes.alive[slots] & inside
+
+def shape_contains(dx, dy, c, s, scale, kind):
+    ## dx, dy: point relative to the shapes' centers, c, s: cos and sin of their angle
+    ## move the point in the quad's space (inverse of toMatrix)
+    lx = np.abs(c * dx + s * dy)
+    ly = np.abs(c * dy - s * dx)
+    in_quad = (lx <= 0.5 * scale) & (ly <= 0.5 * scale)
+
+    in_disk = dx * dx + dy * dy <= scale * scale
+
+    return np.where(kind == SHAPE_QUAD, in_quad, in_disk)
+
+class Overlay:
+    ## White text drawn under the shapes: its rect, and the screen pixels its glyphs light.
+    ## mask is (h, w) bools, rows going up, for the pixels [x, x + w) x [y, y + h) from origin,
+    ## a point is tested on the pixel it falls in. Without a mask the whole rect is lit.
+    __slots__ = ('rect', 'origin', 'mask')
+
+    def __init__(self, rect, origin=(0, 0), mask=None):
+        self.rect = tuple(rect) ## (left, bottom, right, top)
+        self.origin = tuple(origin)
+        self.mask = mask
+
+    def bounds(self):
+        ## (left, bottom, right, top) outside of which nothing is lit
+        if self.mask is None:
+            return self.rect
+        x, y = self.origin
+        h, w = self.mask.shape
+        return (x, y, x + w, y + h)
+
+    def contains(self, px, py):
+        if self.mask is None:
+            left, bottom, right, top = self.rect
+            return left <= px <= right and bottom <= py <= top
+
+        i = floor(px) - self.origin[0]
+        j = floor(py) - self.origin[1]
+        h, w = self.mask.shape
+        return 0 <= i < w and 0 <= j < h and bool(self.mask[j, i])
+
+def is_lit(px, py, shapes, overlays=()):
+    ## overlays are Overlay, drawn in white under the shapes
+    parity = False
+
+    for overlay in overlays:
+        if overlay.contains(px, py):
+            parity = not parity
+
+    ## every slot at once: for a single point it's cheaper than keeping the grid up to date
+    if np.count_nonzero(shapes_containing(shapes, px, py)) % 2 == 1:
+        parity = not parity
+
+    return parity
+
+def text_rect(text):
+    return (text.left, text.bottom, text.right, text.top)
@@ -0,0 +1,51 @@
+from pyglet.window import key as Keys
+from player import INPUT_UP, INPUT_DOWN, INPUT_LEFT, INPUT_RIGHT, INPUT_DASH
+import globals
+
+ACTION_PRESS = 1
+ACTION_RELEASE = 0
+
+KEY_MAPPINGS = {
+    'qwerty': {
+        Keys.W: INPUT_UP,
+        Keys.A: INPUT_LEFT,
+        Keys.S: INPUT_DOWN,
+        Keys.D: INPUT_RIGHT,
+        Keys.SPACE: INPUT_DASH,
+    },
+    'azerty': {
+        Keys.Z: INPUT_UP,
+        Keys.Q: INPUT_LEFT,
+        Keys.S: INPUT_DOWN,
+        Keys.D: INPUT_RIGHT,
+        Keys.SPACE: INPUT_DASH,
+    }
+}
+
+## key -> INPUT_* flag of the current layout, only ever replaced as a whole by set_layout()
+_bindings = {}
+
+def set_layout(keyboard):
+    ## returns False for an unknown layout, the current one stays
+    global _bindings
+    bindings = KEY_MAPPINGS.get(keyboard)
+    if bindings is None:
+        print("Invalid keyboard")
+        return False
+
+    _bindings = bindings
+    globals.keyboard = keyboard
+    return True
+
+def key_input(inputs, key, action):
+    ## returns the INPUT_* flags after a key event
+    flag = _bindings.get(key, 0)
+
+    if action == ACTION_PRESS:
+        return inputs | flag
+    elif action == ACTION_RELEASE:
+        return inputs & ~flag
+
+    return inputs
+
+set_layout(globals.keyboard)
@@ -0,0 +1,295 @@
+#! /usr/bin/python3
+
+## Frame export: frames go into a fixed pool of buffers, a writer thread encodes them.
+##   python src/main.py --export run.mp4                     # record the game (needs ffmpeg)
+##   python src/export.py run.lidr frames/ --scale 0.5       # replay rendered without gpu
+##   python src/export.py run.lidr - | ffplay -f rawvideo -pixel_format rgb24 -video_size 640x360 -
+## The producer takes a free buffer, fills it in place (from a pixel buffer object the gpu
+## read the screen into, see ScreenReader) and hands it over, the writer gives it back once
+## written: the game loop allocates nothing per frame and never waits on the gpu. When every
+## buffer is in use the live game drops the frame instead of waiting on the disk, an offline
+## export waits. A dropped frame is written as a copy of the one before it, so the video
+## keeps its length and its timing.
+
+import argparse
+import ctypes
+import queue
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from collections import deque
+from pathlib import Path
+
+import numpy as np
+
+from softraster import write_ppm
+
+class ImageSequenceSink:
+    ## one .ppm per frame in a directory
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def write(self, index, frame):
+        write_ppm(self.directory / "frame_{:06d}.ppm".format(index), frame)
+
+    def close(self):
+        pass
+
+class RawVideoSink:
+    ## rgb24 frames one after the other, top row first, like ffmpeg's rawvideo
+    def __init__(self, stream, close_stream=True):
+        self.stream = stream
+        self.close_stream = close_stream
+
+    def write(self, index, frame):
+        self.stream.write(memoryview(np.ascontiguousarray(frame[::-1])))
+
+    def close(self):
+        self.stream.flush()
+        if self.close_stream:
+            self.stream.close()
+
+class FFmpegSink(RawVideoSink):
+    ## raw frames piped to an ffmpeg process, which encodes them on its own core
+    def __init__(self, path, size, fps):
+        ffmpeg = shutil.which("ffmpeg")
+        if ffmpeg is None:
+            raise OSError("ffmpeg not found, export to a directory or a .rgb file instead")
+
+        width, height = size
+        self.process = subprocess.Popen([
+            ffmpeg, "-loglevel", "error", "-y",
+            "-f", "rawvideo", "-pix_fmt", "rgb24", "-s", "{}x{}".format(width, height), "-r", str(fps), "-i", "-",
+            "-pix_fmt", "yuv420p", str(path),
+        ], stdin=subprocess.PIPE)
+        super().__init__(self.process.stdin)
+
+    def close(self):
+        super().close()
+        self.process.wait()
+
+def open_sink(path, size, fps=60):
+    ## a directory (no extension), a raw .rgb file, '-' for stdout, or a video file through ffmpeg
+    path = str(path)
+    if path == '-':
+        return RawVideoSink(sys.stdout.buffer, close_stream=False)
+    suffix = Path(path).suffix.lower()
+    if suffix == '':
+        return ImageSequenceSink(path)
+    if suffix in ('.rgb', '.raw'):
+        return RawVideoSink(open(path, 'wb'))
+    return FFmpegSink(path, size, fps)
+
+class FrameExporter:
+    def __init__(self, sink, size, buffers=8, block=False):
+        ## size: (width, height) of the frames, block: wait for a free buffer instead of dropping
+        self.sink = sink
+        self.size = size
+        self.block = block
+
+        width, height = size
+        self.free = queue.Queue()
+        for _ in range(buffers):
+            self.free.put(np.empty((height, width, 3), dtype=np.uint8))
+        self.pending = queue.Queue() ## (buffer, copies, repeats), at most `buffers` of them
+
+        self.frames = 0 ## submitted, copies included
+        self.dropped = 0
+        self.repeats = 0 ## frames dropped since the last submitted one
+        self.written = 0
+        self.error = None
+
+        self.thread = threading.Thread(target=self.write_loop, name="export", daemon=True)
+        self.thread.start()
+
+    def acquire(self):
+        ## a free (height, width, 3) buffer to fill, rows going up, or None when there's none:
+        ## then skip() the frame
+        try:
+            return self.free.get(block=self.block)
+        except queue.Empty:
+            return None
+
+    def skip(self, n=1):
+        ## n frames lost, the frame submitted before them is written again in their place
+        self.dropped += n
+        self.repeats += n
+
+    def submit(self, buffer, copies=1):
+        ## the buffer written `copies` times in a row
+        self.pending.put((buffer, copies, self.repeats))
+        self.frames += self.repeats + copies
+        self.repeats = 0
+
+    def write_loop(self):
+        ## the last frame written is kept out of the pool, for the frames dropped after it
+        last = None
+        index = 0
+        while True:
+            buffer, copies, repeats = self.pending.get()
+            if last is not None:
+                index = self.write(index, last, repeats)
+            if buffer is None: break
+
+            index = self.write(index, buffer, copies)
+            if last is not None:
+                self.free.put(last)
+            last = buffer
+
+        if last is not None:
+            self.free.put(last)
+
+    def write(self, index, buffer, copies):
+        ## returns the index of the next frame
+        for _ in range(copies):
+            if self.error is None:
+                try:
+                    self.sink.write(index, buffer)
+                    self.written += 1
+                except OSError as e:
+                    ## keeps taking frames so the producer never waits, and drops them
+                    self.error = e
+                    print("Could not export the frames: {}".format(e))
+            index += 1
+        return index
+
+    def close(self):
+        ## writes the frames still queued, and copies for the ones dropped at the end
+        self.pending.put((None, 0, self.repeats))
+        self.repeats = 0
+        self.thread.join()
+        try:
+            self.sink.close()
+        except OSError as e:
+            print("Could not finish the export: {}".format(e))
+
+class ScreenReader:
+    ## Frames read back from the screen without waiting for the gpu, like lightmask.py: each
+    ## glReadPixels goes into one of a ring of pixel buffer objects behind a fence, and is only
+    ## copied into a buffer of the exporter's pool once that fence has signalled, a frame or
+    ## two later. When every pixel buffer is still in flight the frame is dropped. The frames
+    ## in flight when the window closes are lost with the gl context, `buffers` of them at most.
+    ## The video runs at fps: frames drawn faster are skipped, slower ones written more than once.
+    def __init__(self, ctx, exporter, fps=60, buffers=3):
+        self.ctx = ctx
+        self.exporter = exporter
+        width, height = exporter.size
+        self.frame_bytes = width * height * 3
+        self.buffers = [ctx.buffer(reserve=self.frame_bytes, usage='stream') for _ in range(buffers)]
+        self.pending = deque() ## (fence, buffer index, copies), oldest first, fence None when dropped
+        self.in_flight = 0
+        self.next_buffer = 0
+
+        self.frame_time = 1.0 / fps
+        self.time = None ## of the frame drawn last, from the first one
+        self.next_frame = 0.0 ## of the next video frame
+
+    def read(self, delta_time):
+        ## the frame just drawn, delta_time seconds after the previous one: read once for the
+        ## video frames due by now, none if it falls between two. Returns False when it's dropped
+        from pyglet import gl
+
+        self.time = 0.0 if self.time is None else self.time + delta_time
+        copies = 0
+        ## a 60Hz frame is exactly one 30 fps frame out of two, whatever the rounding of the sums
+        while self.next_frame <= self.time + 1e-6:
+            self.next_frame += self.frame_time
+            copies += 1
+        if copies == 0: return True
+
+        self.poll()
+        if self.in_flight == len(self.buffers):
+            ## after the reads before it, in order
+            self.pending.append((None, None, copies))
+            return False
+
+        i = self.next_buffer
+        width, height = self.exporter.size
+        self.ctx.screen.use()
+        gl.glPixelStorei(gl.GL_PACK_ALIGNMENT, 1)
+        gl.glBindBuffer(gl.GL_PIXEL_PACK_BUFFER, self.buffers[i].glo.value)
+        gl.glReadPixels(0, 0, width, height, gl.GL_RGB, gl.GL_UNSIGNED_BYTE, 0)
+        gl.glBindBuffer(gl.GL_PIXEL_PACK_BUFFER, 0)
+
+        self.pending.append((gl.glFenceSync(gl.GL_SYNC_GPU_COMMANDS_COMPLETE, 0), i, copies))
+        self.in_flight += 1
+        self.next_buffer = (i + 1) % len(self.buffers)
+        return True
+
+    def poll(self):
+        ## hands the finished reads to the exporter, in order, without blocking
+        from pyglet import gl
+
+        while self.pending:
+            fence, i, copies = self.pending[0]
+            if fence is None:
+                self.pending.popleft()
+                self.exporter.skip(copies)
+                continue
+
+            status = gl.glClientWaitSync(fence, 0, 0)
+            if status not in (gl.GL_ALREADY_SIGNALED, gl.GL_CONDITION_SATISFIED):
+                return
+            self.pending.popleft()
+            gl.glDeleteSync(fence)
+            self.in_flight -= 1
+
+            buffer = self.exporter.acquire()
+            if buffer is None:
+                ## the writer is behind
+                self.exporter.skip(copies)
+                continue
+
+            ## straight from the mapped pixel buffer into the pool's, no copy in between
+            gl.glBindBuffer(gl.GL_PIXEL_PACK_BUFFER, self.buffers[i].glo.value)
+            pixels = gl.glMapBufferRange(gl.GL_PIXEL_PACK_BUFFER, 0, self.frame_bytes, gl.GL_MAP_READ_BIT)
+            ctypes.memmove(buffer.ctypes.data, pixels, self.frame_bytes)
+            gl.glUnmapBuffer(gl.GL_PIXEL_PACK_BUFFER)
+            gl.glBindBuffer(gl.GL_PIXEL_PACK_BUFFER, 0)
+            self.exporter.submit(buffer, copies)
+
+def main():
+    from replay import Recording, frames
+    from softraster import SoftRenderer
+
+    parser = argparse.ArgumentParser(description="Export a recording as frames or video, rendered without gpu")
+    parser.add_argument("recording")
+    parser.add_argument("output", help="directory, .rgb file, '-' for raw frames on stdout, or a video file (ffmpeg)")
+    parser.add_argument("--scale", type=float, default=0.5, help="pixels per screen pixel (default: %(default)s)")
+    parser.add_argument("--fps", type=int, default=60)
+    args = parser.parse_args()
+
+    recording = Recording.load(args.recording)
+    renderer = SoftRenderer(recording.width, recording.height, args.scale)
+    try:
+        sink = open_sink(args.output, renderer.size, args.fps)
+    except OSError as e:
+        print("Could not export: {}".format(e), file=sys.stderr)
+        sys.exit(1)
+    ## offline, nothing to keep up with: waiting for the writer is fine
+    exporter = FrameExporter(sink, renderer.size, block=True)
+
+    t = time.perf_counter()
+    frame_time = 1.0 / args.fps
+    game_time = 0.0
+    next_frame = 0.0
+    for sim, delta_time in zip(frames(recording), recording.dts):
+        game_time += delta_time
+        if game_time < next_frame: continue
+        next_frame += frame_time
+
+        buffer = exporter.acquire()
+        np.copyto(buffer, renderer.render(sim))
+        exporter.submit(buffer)
+    exporter.close()
+    elapsed = time.perf_counter() - t
+
+    print("{} frames of {}x{} in {:.2f}s ({:.0f} frames/s)".format(
+        exporter.written, renderer.size[0], renderer.size[1], elapsed, exporter.written / max(elapsed, 1e-9)),
+        file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
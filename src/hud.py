@@ -0,0 +1,165 @@
+import arcade
+import numpy as np
+import pyglet
+from pyglet import gl
+from math import ceil, floor, radians
+from pyglet.math import Mat4, Vec3
+from collision import Overlay, text_rect
+
+_UNSET = object()
+COVERAGE_MARGIN = 2 ## pixels read around a text's rect, antialiased glyph edges can stick out
+
+class Hud:
+    ## Named texts, laid out again only when the value they show changes.
+    ## Batched texts are all drawn by one draw(), the others one by one, optionally
+    ## rotated through the view matrix so their glyphs are never touched.
+    ## A text is only created (its glyphs rendered) the first time it's used or by prepare(),
+    ## the ones not on the first screen cost nothing at startup.
+    def __init__(self, ctx):
+        self.ctx = ctx
+        self.batch = pyglet.graphics.Batch()
+        self.texts = {}
+        self.formats = {}
+        self.values = {}
+        self.pending = {} ## name -> (batched, kwargs) of the texts not created yet
+        self.kwargs = {} ## name -> kwargs of the texts created
+        self.overlays = {} ## name -> ((text, rect), Overlay) of the string last shown
+        self.coverage_framebuffer = None
+        self.coverage_texts = {} ## name -> unbatched copy of the text, drawn alone for its glyph masks
+        self.coverage_buffers = {} ## name -> pixel buffer object its glyph masks are read into
+        self.coverage_requests = {} ## name -> ((text, rect), fence, (x, y, width, height)) in flight
+
+    def add(self, name, format="{}", value="", batched=True, **kwargs):
+        self.formats[name] = format
+        self.values[name] = value
+        self.pending[name] = (batched, kwargs)
+
+    def create(self, name):
+        batched, kwargs = self.pending.pop(name)
+        self.kwargs[name] = kwargs
+        text = arcade.Text(text=self.formats[name].format(self.values[name]), batch=self.batch if batched else None, **kwargs)
+        self.texts[name] = text
+        return text
+
+    def prepare(self):
+        ## creates one of the texts not used yet, returns False when there's none left.
+        ## Called once per frame while waiting, they're ready when needed
+        if not self.pending: return False
+        self.create(next(iter(self.pending)))
+        return True
+
+    def __getitem__(self, name):
+        text = self.texts.get(name)
+        if text is None:
+            text = self.create(name)
+        return text
+
+    def set(self, name, value):
+        if self.values.get(name, _UNSET) == value: return
+        self.values[name] = value
+        if name in self.texts:
+            self.texts[name].text = self.formats[name].format(value)
+
+    def show(self, name, visible=True):
+        text = self[name]
+        if text.visible != visible:
+            text.visible = visible
+
+    def draw(self):
+        ## batched texts never used until now are drawn too
+        if self.pending:
+            for name in [name for name, (batched, _) in self.pending.items() if batched]:
+                self.create(name)
+        self.batch.draw()
+
+    def overlay(self, name):
+        ## the text as a collision.Overlay. A new string is its whole rect until the gpu has read
+        ## back its glyph mask, a frame or two later, without ever waiting for it
+        text = self[name]
+        key = (text.text, text_rect(text))
+        cached = self.overlays.get(name)
+        if cached is None or cached[0] != key:
+            cached = self.overlays[name] = (key, Overlay(key[1]))
+            self.request_coverage(name, text, key)
+        elif name in self.coverage_requests:
+            self.poll_coverage(name)
+            cached = self.overlays[name]
+        return cached[1]
+
+    def request_coverage(self, name, text, key):
+        ## the text drawn alone, where it is on screen, white over black like the screen, and
+        ## the region around its rect copied into a pixel buffer object behind a fence
+        width, height = self.ctx.window.width, self.ctx.window.height
+        if self.coverage_framebuffer is None or self.coverage_framebuffer.size != (width, height):
+            texture = self.ctx.texture((width, height), components=4)
+            self.coverage_framebuffer = self.ctx.framebuffer(color_attachments=[texture])
+
+        left, bottom, right, top = key[1]
+        x0 = min(max(floor(left) - COVERAGE_MARGIN, 0), width)
+        y0 = min(max(floor(bottom) - COVERAGE_MARGIN, 0), height)
+        x1 = min(max(ceil(right) + COVERAGE_MARGIN, x0), width)
+        y1 = min(max(ceil(top) + COVERAGE_MARGIN, y0), height)
+        viewport = (x0, y0, x1 - x0, y1 - y0)
+        size = viewport[2] * viewport[3]
+
+        buffer = self.coverage_buffers.get(name)
+        if buffer is None or buffer.size < size:
+            buffer = self.coverage_buffers[name] = self.ctx.buffer(reserve=max(size, 1), usage='stream')
+
+        ## a copy out of the batch, the batch would draw every text in it, and moving the text
+        ## itself out and back rebuilds its vertices twice
+        copy = self.coverage_texts.get(name)
+        if copy is None:
+            copy = self.coverage_texts[name] = arcade.Text(text=text.text, **self.kwargs[name])
+        elif copy.text != text.text:
+            copy.text = text.text
+        if (copy.x, copy.y) != (text.x, text.y):
+            copy.position = (text.x, text.y)
+
+        framebuffer = self.coverage_framebuffer
+        with framebuffer.activate():
+            framebuffer.clear(viewport=viewport)
+            copy.draw()
+            gl.glReadBuffer(gl.GL_COLOR_ATTACHMENT0)
+            gl.glPixelStorei(gl.GL_PACK_ALIGNMENT, 1)
+            gl.glBindBuffer(gl.GL_PIXEL_PACK_BUFFER, buffer.glo.value)
+            gl.glReadPixels(*viewport, gl.GL_RED, gl.GL_UNSIGNED_BYTE, 0)
+            gl.glBindBuffer(gl.GL_PIXEL_PACK_BUFFER, 0)
+
+        ## a request for the previous string of the text is forgotten
+        self.cancel_coverage(name)
+        fence = gl.glFenceSync(gl.GL_SYNC_GPU_COMMANDS_COMPLETE, 0)
+        self.coverage_requests[name] = (key, fence, viewport)
+
+    def poll_coverage(self, name):
+        ## the glyph mask of the text once its read back is done, nothing if it isn't yet
+        key, fence, (x, y, width, height) = self.coverage_requests[name]
+        status = gl.glClientWaitSync(fence, 0, 0)
+        if status not in (gl.GL_ALREADY_SIGNALED, gl.GL_CONDITION_SATISFIED): return
+
+        self.cancel_coverage(name)
+        data = self.coverage_buffers[name].read(size=width * height)
+        ## lit like the lightmask reads it: more than half white
+        mask = np.frombuffer(data, dtype=np.uint8).reshape(height, width) > 127
+        self.overlays[name] = (key, Overlay(key[1], (x, y), mask))
+
+    def cancel_coverage(self, name):
+        request = self.coverage_requests.pop(name, None)
+        if request is not None:
+            gl.glDeleteSync(request[1])
+
+    def draw_text(self, name, rotation=0.0):
+        ## rotation in degrees, clockwise around the text's position like arcade.Text.rotation
+        text = self[name]
+        if not rotation:
+            text.draw()
+            return
+
+        x, y = text.x, text.y
+        view = self.ctx.view_matrix
+        self.ctx.view_matrix = view @\
+            Mat4.from_translation(Vec3(x, y, 0.0)) @\
+            Mat4.from_rotation(-radians(rotation), Vec3(0.0, 0.0, 1.0)) @\
+            Mat4.from_translation(Vec3(-x, -y, 0.0))
+        text.draw()
+        self.ctx.view_matrix = view
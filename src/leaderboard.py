@@ -0,0 +1,272 @@
+#! /usr/bin/python3
+
+## Local leaderboard: every finished run appended to a log file, never rewritten.
+##   python src/leaderboard.py            # top 10 of ~/.light-is-death/leaderboard.log
+##   python src/leaderboard.py -n 50 --replay 1 best.lidr
+## Each record is framed by its length and crc32. A record cut short by a crash, at the
+## end of the log, is dropped at the next load and overwritten by the next append. A bad
+## record with valid ones after it is skipped, and never overwritten.
+## Loading streams the log once and only keeps the best `size` runs in a heap, the
+## replays stay on disk and are read back on demand. Appending happens on a writer
+## thread, the game only puts the run in a queue.
+
+import argparse
+import heapq
+import os
+import queue
+import struct
+import sys
+import threading
+import time
+import zlib
+from pathlib import Path
+
+MAGIC = b'LIDL'
+VERSION = 1
+
+FILE_HEADER = struct.Struct('<4sB') ## magic, version
+FRAME = struct.Struct('<II') ## payload length, crc32 of the payload
+## score, seed, time (unix), duration (seconds), keyboard layout length,
+## followed by the layout and the replay (the rest of the payload, maybe empty)
+RUN = struct.Struct('<dQddB')
+
+MAX_PAYLOAD = 64 * 1024 * 1024 ## bigger means a corrupted length
+
+DEFAULT_PATH = Path.home() / ".light-is-death" / "leaderboard.log"
+
+class LeaderboardError(Exception):
+    pass
+
+class Run:
+    def __init__(self, score, seed, duration, layout, timestamp=None, replay=None):
+        self.score = score
+        self.seed = seed
+        self.duration = duration ## wall clock seconds the run lasted
+        self.layout = layout ## keyboard layout, see controls.KEY_MAPPINGS
+        self.timestamp = timestamp if timestamp is not None else time.time()
+        ## replay: bytes, or a replay.Recording serialized by the writer thread,
+        ## None once written (read it back with Leaderboard.replay())
+        self.replay = replay
+        self.replay_start = 0 ## in the payload
+        self.replay_size = 0
+        self.offset = None ## of the record in the log, once written
+
+    def __lt__(self, other):
+        ## heap order: lower score first, on a tie the later run first
+        return (self.score, -self.timestamp) < (other.score, -other.timestamp)
+
+    def payload(self):
+        replay = self.replay
+        if replay is None:
+            replay = b''
+        elif not isinstance(replay, (bytes, bytearray)):
+            replay = replay.to_bytes()
+
+        layout = self.layout.encode('utf-8')[:255]
+        self.replay_start = RUN.size + len(layout)
+        self.replay_size = len(replay)
+        return RUN.pack(self.score, self.seed, self.timestamp, self.duration, len(layout)) + layout + replay
+
+    @classmethod
+    def from_payload(cls, payload, offset):
+        score, seed, timestamp, duration, n = RUN.unpack_from(payload)
+        layout = bytes(payload[RUN.size:RUN.size + n]).decode('utf-8', 'replace')
+
+        run = cls(score, seed, duration, layout, timestamp)
+        run.replay_start = RUN.size + n
+        run.replay_size = len(payload) - run.replay_start
+        run.offset = offset
+        return run
+
+def read_records(f):
+    ## yields (offset, payload) of every valid record. A bad record followed by a valid one
+    ## is skipped, a bad tail (a torn write) ends the log: f is left right after the last
+    ## valid record, where the next append goes
+    offset = f.tell()
+    while True:
+        frame = f.read(FRAME.size)
+        if len(frame) < FRAME.size: break
+
+        length, crc = FRAME.unpack(frame)
+        payload = f.read(length) if RUN.size <= length <= MAX_PAYLOAD else None
+        if payload is not None and len(payload) == length and zlib.crc32(payload) == crc:
+            yield offset, payload
+            offset += FRAME.size + length
+            continue
+
+        f.seek(offset)
+        skipped = resync(f.read())
+        if skipped is None: break
+        print("Skipped {} corrupted bytes of the leaderboard at {}".format(skipped, offset))
+        offset += skipped
+        f.seek(offset)
+
+    f.seek(offset)
+
+def resync(data):
+    ## offset of the first valid record in data after its start, None when there's none
+    for i in range(1, len(data) - FRAME.size + 1):
+        length, crc = FRAME.unpack_from(data, i)
+        if not RUN.size <= length <= MAX_PAYLOAD or i + FRAME.size + length > len(data): continue
+        if zlib.crc32(data[i + FRAME.size:i + FRAME.size + length]) == crc:
+            return i
+    return None
+
+class Leaderboard:
+    def __init__(self, path=DEFAULT_PATH, size=10):
+        self.path = Path(path)
+        self.size = size ## runs kept by the index
+        self.best = [] ## heap of the `size` best runs, the worst of them first
+        self.runs = 0 ## every run in the log
+        self.end = None ## where the next record goes, past the valid records
+        self.writable = True ## not when the file isn't ours
+
+        self.queue = queue.Queue()
+        self.thread = None
+        self.lock = threading.Lock() ## the file, shared by the writer and replay()
+
+        try:
+            self.load()
+        except (OSError, LeaderboardError) as e:
+            print("Could not load the leaderboard: {}".format(e))
+            self.writable = False
+
+    def load(self):
+        ## O(runs) time, O(size) memory: one pass over the log
+        self.best = []
+        self.runs = 0
+        self.end = None
+        if not self.path.exists(): return
+
+        with open(self.path, 'rb') as f:
+            header = f.read(FILE_HEADER.size)
+            if len(header) < FILE_HEADER.size: return ## rewritten by the first append
+            magic, version = FILE_HEADER.unpack(header)
+            if magic != MAGIC:
+                raise LeaderboardError("{} is not a leaderboard".format(self.path))
+            if version != VERSION:
+                raise LeaderboardError("unsupported leaderboard version {}".format(version))
+
+            for offset, payload in read_records(f):
+                self.add(Run.from_payload(payload, offset))
+            self.end = f.tell()
+
+    def add(self, run):
+        ## into the index only
+        self.runs += 1
+        if len(self.best) < self.size:
+            heapq.heappush(self.best, run)
+        elif self.best[0] < run:
+            heapq.heapreplace(self.best, run)
+
+    def top(self, n=None):
+        ## best runs first
+        return heapq.nlargest(n or self.size, self.best)
+
+    def high_score(self):
+        return max(self.best).score if self.best else 0.0
+
+    def submit(self, run, replay_path=None):
+        ## indexed right away, written to the log by the writer thread,
+        ## and its replay to replay_path too if given
+        self.add(run)
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.write_loop, name="leaderboard", daemon=True)
+            self.thread.start()
+        self.queue.put((run, replay_path))
+
+    def write_loop(self):
+        while True:
+            item = self.queue.get()
+            if item is None: break
+            run, replay_path = item
+            try:
+                self.append(run, replay_path)
+            except OSError as e:
+                print("Could not save the run: {}".format(e))
+
+    def append(self, run, replay_path=None):
+        payload = run.payload()
+        if replay_path is not None and run.replay_size:
+            replay_path = Path(replay_path)
+            replay_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(replay_path, 'wb') as f:
+                f.write(payload[run.replay_start:])
+
+        if not self.writable:
+            raise OSError("{} is not a leaderboard this version can write".format(self.path))
+
+        record = FRAME.pack(len(payload), zlib.crc32(payload)) + payload
+
+        with self.lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            mode = 'r+b' if self.path.exists() else 'w+b'
+            with open(self.path, mode) as f:
+                if self.end is None:
+                    ## new or empty log
+                    f.truncate(0)
+                    f.write(FILE_HEADER.pack(MAGIC, VERSION))
+                    self.end = FILE_HEADER.size
+
+                ## anything past the last valid record is a torn write, overwritten
+                f.seek(self.end)
+                f.write(record)
+                f.truncate()
+                f.flush()
+                os.fsync(f.fileno())
+
+            run.offset = self.end
+            run.replay = None ## on disk now, don't hold it in memory
+            self.end += len(record)
+
+    def replay(self, run):
+        ## the replay bytes of a written run, None if it has none
+        if run.offset is None or run.replay_size == 0:
+            return None
+
+        with self.lock, open(self.path, 'rb') as f:
+            f.seek(run.offset + FRAME.size + run.replay_start)
+            return f.read(run.replay_size)
+
+    def flush(self):
+        ## waits for every submitted run to be on disk
+        if self.thread is None: return
+        self.queue.put(None)
+        self.thread.join()
+        self.thread = None
+
+    close = flush
+
+def main():
+    parser = argparse.ArgumentParser(description="Light is death leaderboard")
+    parser.add_argument("path", nargs='?', default=DEFAULT_PATH)
+    parser.add_argument("-n", type=int, default=10, help="runs to show")
+    parser.add_argument("--replay", nargs=2, metavar=("RANK", "FILE"), help="write the replay of the run at this rank to a .lidr file")
+    args = parser.parse_args()
+
+    t = time.perf_counter()
+    leaderboard = Leaderboard(args.path, size=args.n)
+    elapsed = time.perf_counter() - t
+
+    top = leaderboard.top()
+    for rank, run in enumerate(top, 1):
+        print("{:3d}. {:8.3f}s  seed {:<20d} {:>7.1f}s  {:<7s} {}{}".format(
+            rank, run.score, run.seed, run.duration, run.layout,
+            time.strftime("%Y-%m-%d %H:%M", time.localtime(run.timestamp)),
+            "  replay" if run.replay_size else ""))
+    print("{} runs loaded in {:.1f}ms".format(leaderboard.runs, elapsed * 1000))
+
+    if args.replay:
+        rank, path = int(args.replay[0]), args.replay[1]
+        if not 1 <= rank <= len(top):
+            print("no run at rank {}".format(rank))
+            sys.exit(1)
+        data = leaderboard.replay(top[rank - 1])
+        if data is None:
+            print("that run has no replay")
+            sys.exit(1)
+        with open(path, 'wb') as f:
+            f.write(data)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+import numpy as np
+from pyglet import gl
+
+## Low resolution copy of what is lit on screen (hud texts, then the shapes inverting them),
+## read back asynchronously: the texels around the player are copied into a pixel buffer
+## object behind a fence, and only read once the gpu is done, one frame later.
+## Nothing here ever waits for the gpu, when no read back is ready the caller falls back
+## to the analytic test (collision.is_lit).
+
+MASK_SCALE = 4 ## screen pixels per mask texel
+REGION = 8 ## texels read around the player, REGION x REGION
+
+class LightMask:
+    def __init__(self, ctx, width, height, scale=MASK_SCALE):
+        self.ctx = ctx
+        self.width = width
+        self.height = height
+
+        ## two reads in flight at most
+        self.buffers = [ctx.buffer(reserve=REGION * REGION, usage='stream') for _ in range(2)]
+        self.pending = [None, None] ## (fence, (x, y, width, height)) per buffer
+        self.next_buffer = 0
+
+        ## last texels read back and where they are in the mask
+        self.texels = None
+        self.origin = (0, 0)
+        self.hits = 0 ## probes answered from a read back
+        self.misses = 0 ## and left to the analytic test
+
+        self.resize(scale)
+
+    def resize(self, scale):
+        ## screen pixels per texel, the read backs in flight are dropped
+        self.reset()
+        self.scale = scale
+        self.size = (max(1, self.width // scale), max(1, self.height // scale))
+
+        self.texture = self.ctx.texture(self.size, components=1)
+        self.framebuffer = self.ctx.framebuffer(color_attachments=[self.texture])
+
+    def render(self, draw_hud, draw_shapes):
+        ## same two passes as the screen: the hud drawn normally, then the shapes inverting it
+        with self.framebuffer.activate():
+            self.framebuffer.clear()
+            draw_hud()
+            draw_shapes()
+
+    def request(self, px, py):
+        ## starts copying the texels around the screen point, returns False when both buffers are busy
+        i = self.next_buffer
+        if self.pending[i] is not None:
+            self.poll()
+            if self.pending[i] is not None:
+                return False
+
+        w, h = self.size
+        x = min(max(int(px / self.scale) - REGION // 2, 0), max(w - REGION, 0))
+        y = min(max(int(py / self.scale) - REGION // 2, 0), max(h - REGION, 0))
+        width, height = min(REGION, w), min(REGION, h)
+
+        with self.framebuffer.activate():
+            gl.glReadBuffer(gl.GL_COLOR_ATTACHMENT0)
+            gl.glPixelStorei(gl.GL_PACK_ALIGNMENT, 1)
+            gl.glBindBuffer(gl.GL_PIXEL_PACK_BUFFER, self.buffers[i].glo.value)
+            gl.glReadPixels(x, y, width, height, gl.GL_RED, gl.GL_UNSIGNED_BYTE, 0)
+            gl.glBindBuffer(gl.GL_PIXEL_PACK_BUFFER, 0)
+
+        fence = gl.glFenceSync(gl.GL_SYNC_GPU_COMMANDS_COMPLETE, 0)
+        self.pending[i] = (fence, (x, y, width, height))
+        self.next_buffer = 1 - i
+        return True
+
+    def poll(self):
+        ## picks up the finished reads without blocking, the newest one wins
+        for i in (self.next_buffer, 1 - self.next_buffer):
+            pending = self.pending[i]
+            if pending is None: continue
+
+            fence, (x, y, width, height) = pending
+            status = gl.glClientWaitSync(fence, 0, 0)
+            if status not in (gl.GL_ALREADY_SIGNALED, gl.GL_CONDITION_SATISFIED):
+                continue
+
+            gl.glDeleteSync(fence)
+            self.pending[i] = None
+            data = self.buffers[i].read(size=width * height)
+            self.texels = np.frombuffer(data, dtype=np.uint8).reshape(height, width)
+            self.origin = (x, y)
+
+    def probe(self, px, py):
+        ## True/False when the point is in the last read back, None when it can't tell
+        self.poll()
+        if self.texels is None:
+            self.misses += 1
+            return None
+
+        tx = int(px / self.scale) - self.origin[0]
+        ty = int(py / self.scale) - self.origin[1]
+        height, width = self.texels.shape
+        if not (0 <= tx < width and 0 <= ty < height):
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return bool(self.texels[ty, tx] > 127)
+
+    def reset(self):
+        ## forget the read backs of a previous game
+        for i, pending in enumerate(self.pending):
+            if pending is not None:
+                gl.glDeleteSync(pending[0])
+                self.pending[i] = None
+        self.texels = None
@@ -1,80 +1,55 @@
 #! /usr/bin/python3
 
+## the launch, timed from here (--startup-report)
+import startup
+
+## no sound in the game: pyglet would load the audio drivers (openal, pulse, ...) and open
+## a device as soon as arcade is imported, about a tenth of a second
+import pyglet
+pyglet.options.audio = ('silent',)
+
 import arcade
-import arcade.gui
-from arcade.types import Color
-from random import randint, uniform
-from math import cos, sin, atan2, tau
-from array import array
+startup.mark("import arcade")
+
+from math import cos, sin
 from pathlib import Path
+import argparse
 import time
 from pyglet.math import Mat4
-from OpenGL.GL import *
-from utils import *
-from player import Player
-from shapes import ShapeBuilder
-from particles import ParticleSystem
+from utils import map_range
+from player import INPUT_DASH
+from controls import key_input, set_layout, ACTION_PRESS, ACTION_RELEASE
+from renderer import ShapeRenderer, ParticleRenderer, ScaledScreen
+from simulation import Simulation, STATE_START, STATE_PLAYING, STATE_OVER
+from replay import Recorder
+from profiler import FrameProfiler
+from timestep import FixedTimestep, TICK_RATE
+from lightmask import LightMask
+from hud import Hud
+from leaderboard import Leaderboard, Run
+from quality import QualityController, Knob
+from export import FrameExporter, ScreenReader, open_sink
 
 import globals
+startup.mark("import game")
 
 SCREEN_WIDTH = 1280
 SCREEN_HEIGHT = 720
 SCREEN_TITLE = "Global Game-Jam 2022"
 
-ASSETS_PATH = Path(__file__).parent.parent.resolve() / "resources"
-
-class Shape:
-    ## to have a concret object for moving shapes instead of a list
-    def __init__(self, x, y, angle, scale, dir, speed, shape):
-        self.x = x
-        self.y = y
-        self.angle = angle
-        self.scale = scale
-        self.dir = dir
-        self.speed = speed
-        self.shape = shape
-
-    def update(self, delta_time):
-        self.x += cos(self.dir) * self.speed * delta_time
-        self.y += sin(self.dir) * self.speed * delta_time
-
-STATE_START = 0
-STATE_PLAYING = 1
-STATE_OVER = 2
-
-vert=\
-"""
-#version 330 core
-
-uniform mat4 u_projectionMatrix;
-uniform mat4 u_modelMatrix;
-
-in vec2 in_vert;
-
-void main() {
-    gl_Position = u_projectionMatrix * u_modelMatrix * vec4(in_vert, 0.0, 1.0);
-}
-
-"""
-
-frag=\
-"""
-#version 330 core
-
-out vec4 f_color;
-
-void main() {
-    ivec2 uv = ivec2(gl_FragCoord.xy);
-    vec3 color = vec3(1.0, 1.0, 1.0);
-    f_color = vec4(color, 1.0);
-}
-"""
+DATA_PATH = Path.home() / ".light-is-death"
+REPLAYS_PATH = DATA_PATH / "replays"
+LEADERBOARD_PATH = DATA_PATH / "leaderboard.log"
 
 class MenuView(arcade.View):
     def __init__(self, parent_view):
         super().__init__()
         self.parent_view = parent_view
 
+        ## the gui is only needed here, not imported before the menu is first opened
+        import arcade.gui
+        from arcade.types import Color
+
         self.ui = arcade.gui.UIManager()
         self.anchor = self.ui.add(arcade.gui.UIAnchorLayout())
 
@@ -141,17 +116,15 @@ class MenuView(arcade.View):
             self.set_keyboard('azerty')
 
     def set_keyboard(self, keyboard: str):
+        if not set_layout(keyboard): return
+
         if keyboard == 'qwerty':
             self.btn_qwerty.style = self.btn_style_selected
             self.btn_azerty.style = self.btn_style
         elif keyboard == 'azerty':
             self.btn_azerty.style = self.btn_style_selected
             self.btn_qwerty.style = self.btn_style
-        else:
-            print("Invalid keyboard")
-            return
 
-        globals.keyboard = keyboard
         self.ui.trigger_render()
 
     def on_show_view(self):
@@ -172,52 +145,88 @@ class MenuView(arcade.View):
             self.window.show_view(self.parent_view)
 
 class Game(arcade.View):
-    def __init__(self, *args, **kwargs):
+    def __init__(self, tick_rate=TICK_RATE, pixel_collision=False, disk_mode='lod', target_fps=60, adaptive=True, export=None, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.setup()
-
-    def setup(self):
-        self.projection = Mat4.orthogonal_projection(0, self.width, 0, self.height, -1, 1)
-
-        self.program = {
-            "SHAPE":  self.window.ctx.program(
-                vertex_shader=vert,
-                fragment_shader=frag)
-        }
-
-        self.quad = arcade.gl.geometry.quad_2d(size=(1, 1), pos=(0, 0))
-        self.disk =  self.window.ctx.geometry([arcade.gl.BufferDescription(
-             self.window.ctx.buffer(data=array('f', ShapeBuilder.disk())),
-            '2f',
-            ['in_vert'],
-        )], mode= self.window.ctx.TRIANGLE_FAN)
-
-
-        ## Player
-        self.player = Player(x=self.width/2, y=self.height/2)
-
-        ## Dash particules trail
-        self.trailSystem = ParticleSystem()
+        self.pixel_collision = pixel_collision
+        self.disk_mode = disk_mode
+        self.target_fps = target_fps
+        self.adaptive = adaptive
+        self.export = export
+
+        ## the simulation steps at tick_rate whatever the display refresh rate is
+        self.timestep = FixedTimestep(tick_rate)
+
+        ## F3 to show frame timings
+        self.profiler = FrameProfiler(
+            stages=('update', 'hud', 'shapes', 'mask', 'particles', 'player'),
+            counters=('draw_calls', 'shapes', 'vertices', 'particles', 'steps', 'dropped_ms', 'mask_hits', 'mask_misses',
+                'max_particles', 'disk_segments', 'mask_scale', 'render_scale'))
+        self.text_profiler = arcade.Text(
+            text="",
+            x=10,
+            y=self.height - 10,
+            font_size=11,
+            font_name="monospace",
+            multiline=True,
+            width=400,
+            anchor_y="top",
+        )
+        self.time_next_profiler_refresh = 0.0
+        self.frame_begin = None ## perf_counter() at the start of on_update
+        self.frame_interval = 0.0
+        self.quality_skip = 0 ## frames not measured by the quality controller
 
-        ## Shapes
-        self.max_time_next_shape = 1
-        self.time_next_shape = self.max_time_next_shape
+        self.first_frame = True
+        self.startup_report = False ## print the startup timings once the first frame is drawn
 
-        ## 0 == cube; 1 == disk
-        self.shapes = []
-        self.max_shapes = 10
-        self.max_cooldown_increase_max_shapes = 2.0 #seconds
-        self.cooldown_increase_max_shapes = self.max_cooldown_increase_max_shapes
+        ## every finished run, saved in the background
+        self.leaderboard = Leaderboard(LEADERBOARD_PATH)
 
-        ## Game Logic
-        # self.started = False
-        self.game_state = STATE_START
+        self.init_resources()
+        self.setup()
 
-        ## HighScore
-        self.time_since_start = 0.0
+    def init_resources(self):
+        ## everything living on the gpu, allocated once: restarting only calls setup()
+        self.projection = Mat4.orthogonal_projection(0, self.width, 0, self.height, -1, 1)
 
-        self.text_start = arcade.Text(
-            text="Press SPACE to start !!",
+        ## frames drawn at a lower resolution when the gpu can't keep up
+        self.scene = ScaledScreen(self.window.ctx)
+
+        ## all quads and disks are drawn instanced, disks with as few segments as their size on screen allows
+        self.pixel_scale = self.window.get_framebuffer_size()[0] / self.window.width
+        self.shape_renderer = ShapeRenderer(self.window.ctx, self.disk_mode, pixel_scale=self.pixel_scale)
+        self.particle_renderer = ParticleRenderer(self.window.ctx)
+
+        ## what the player sees as light, read back from the gpu one frame late
+        self.light_mask = None
+        if self.pixel_collision:
+            self.light_mask = LightMask(self.window.ctx, self.width, self.height)
+
+        ## quality lowered while frames miss target_fps, and raised back when they don't
+        self.quality = None
+        if self.adaptive:
+            self.quality = QualityController(self.quality_knobs(), self.target_fps)
+            self.quality.on_decision = self.on_quality_decision
+
+        ## the frames drawn, at target_fps of the time they're shown, written by another thread.
+        ## Dropped when it can't keep up, the previous one written again in their place
+        self.exporter = None
+        self.screen_reader = None
+        if self.export:
+            size = self.window.get_framebuffer_size()
+            try:
+                self.exporter = FrameExporter(open_sink(self.export, size, self.target_fps), size)
+                self.screen_reader = ScreenReader(self.window.ctx, self.exporter, self.target_fps)
+            except OSError as e:
+                print("Could not export: {}".format(e))
+
+        ## texts only laid out again when they change, the playing ones drawn in one batch.
+        ## Each one is created when first used, or while the start screen waits, see on_draw()
+        self.hud = Hud(self.window.ctx)
+
+        self.hud.add("start",
+            value="Press SPACE to start !!",
+            batched=False,
             x=self.width/2,
             y=self.height/2,
             font_size=42,
@@ -226,8 +235,7 @@ class Game(arcade.View):
             anchor_y="center"
         )
 
-        self.text_tutorial = arcade.Text(
-            text="",
+        self.hud.add("tutorial",
             x=self.width/2,
             y=self.height/4,
             bold=True,
@@ -236,8 +244,9 @@ class Game(arcade.View):
             anchor_y="center"
         )
 
-        self.text_highscore = arcade.Text(
-            text="HighScore: 0",
+        self.hud.add("highscore",
+            format="HighScore: {}",
+            value=0,
             x=self.width/2,
             y=self.height - 35,
             font_size=22,
@@ -246,8 +255,9 @@ class Game(arcade.View):
             anchor_y="center"
         )
 
-        self.text_gameover = arcade.Text(
-            text="Game Over :(",
+        self.hud.add("gameover",
+            value="Game Over :(",
+            batched=False,
             x=self.width/2,
             y=self.height/2,
             font_size=42,
@@ -256,8 +266,10 @@ class Game(arcade.View):
             anchor_y="center",
         )
 
-        self.text_gameover_highscore = arcade.Text(
-            text="HighScore: {}".format(round(self.time_since_start)),
+        self.hud.add("gameover_highscore",
+            format="HighScore: {}",
+            value=0,
+            batched=False,
             x=self.width/2,
             y=self.height/2 + 150,
             font_size=18,
@@ -266,206 +278,262 @@ class Game(arcade.View):
             anchor_y="center",
         )
 
-    def generate_shapes(self, n=1):
-        for _ in range(n):
-            shape = randint(0, 1)
-
-            ## coming offscreen to somewhere into the screen
-            x, y = random_uniform_vec2()
-            x = (x * self.width) + self.width/2
-            y = (y * self.width) + self.height/2
+        self.hud.add("gameover_best",
+            format="Best: {}",
+            value=0,
+            batched=False,
+            x=self.width/2,
+            y=self.height/2 - 150,
+            font_size=18,
+            bold=True,
+            anchor_x="center",
+            anchor_y="center",
+        )
 
-            ## point in screen to get direction
-            px, py = uniform(0, self.width), uniform(0, self.height)
-            dx, dy = px - x, py - y
-            dir = atan2(dy, dx)
+    def quality_knobs(self):
+        ## lowered in this order, raised back in the reverse one
+        knobs = [
+            Knob('max_particles', (4096, 1024, 256, 64), lambda value: setattr(self.particle_renderer, 'max_particles', value)),
+            Knob('disk_segments', (128, 64, 32, 16), lambda value: setattr(self.shape_renderer, 'max_disk_segments', value)),
+        ]
+        if self.light_mask is not None:
+            knobs.append(Knob('mask_scale', (self.light_mask.scale, self.light_mask.scale * 2), self.light_mask.resize))
+        knobs.append(Knob('render_scale', (1.0, 0.75, 0.5), self.set_render_scale))
+        return knobs
 
-            speed = uniform(35, 120)
-            angle = uniform(0, tau)
-            scale = uniform(200, self.width/3)
+    def set_render_scale(self, scale):
+        self.scene.scale = scale
+        self.shape_renderer.pixel_scale = self.pixel_scale * scale
 
-            yield Shape(x, y, angle, scale, dir, speed, shape)
+    def on_quality_decision(self, decision):
+        print("quality: {knob} {from} -> {to} (frame p90 {frame_p90_ms}ms, busy p90 {busy_p90_ms}ms, budget {budget_ms}ms)".format(**decision))
 
-        # if n > 1:
-        #     self.generate_shapes(n=n-1)
+    def setup(self):
+        ## game logic, the view only draws it
+        self.sim = Simulation(self.width, self.height)
+        self.recorder = Recorder(self.sim)
+        self.inputs = 0 ## INPUT_* flags from the keyboard
+        self.run_start = None ## wall clock time the game started
+        self.timestep.reset()
+        if self.light_mask is not None:
+            self.light_mask.reset()
+            self.sim.lit_probe = self.light_mask.probe
+
+        self.hud.set("tutorial", "")
+        self.hud.show("tutorial")
+        self.hud.set("highscore", 0)
 
     def render_shapes(self):
-        glClear(GL_STENCIL_BUFFER_BIT)
-        glStencilMask(1)
-        glEnable(GL_COLOR_LOGIC_OP)
-        glLogicOp(GL_INVERT)
-
-        self.program['SHAPE']['u_projectionMatrix'] = self.projection
-
-        for i, shape in enumerate(self.shapes):
-            m = toMatrix(x=shape.x, y=shape.y, angle=shape.angle, scale=shape.scale)
-            self.program['SHAPE']['u_modelMatrix'] = m
-            if shape.shape == 0:
-                self.quad.render(program=self.program['SHAPE'])
-            else:
-                self.disk.render(program=self.program['SHAPE'])
-
-        # self.ctx.flush()
-        glDisable(GL_COLOR_LOGIC_OP)
+        ## inverts whatever is under the shapes
+        with self.profiler.stage('shapes'):
+            self.shape_renderer.upload(self.sim.shapes, self.timestep.alpha)
+            self.profiler.count('draw_calls', self.shape_renderer.render(self.projection))
 
     def draw_start(self):
-        self.text_start.rotation = sin(time.time() * 3) * 10
-        self.text_start.draw()
-
-        self.window.ctx.flush()
+        self.hud.draw_text("start", rotation=sin(time.time() * 3) * 10)
         self.render_shapes()
 
     def draw_over(self):
-        self.text_gameover.rotation = sin(time.time() * 3) * 10
-        self.text_gameover.draw()
+        self.hud.draw_text("gameover", rotation=sin(time.time() * 3) * 10)
 
-        self.text_gameover_highscore.text = "HighScore: {}".format(round(self.time_since_start))
-        self.text_gameover_highscore.rotation = cos(time.time() * 3) * 10
-        self.text_gameover_highscore.draw()
+        self.hud.set("gameover_highscore", round(self.sim.time_since_start))
+        self.hud.draw_text("gameover_highscore", rotation=cos(time.time() * 3) * 10)
 
-    def on_draw(self):
-        self.clear()
-        self.window.ctx.disable(self.window.ctx.DEPTH_TEST)
-
-        if self.game_state == STATE_START:
-            self.draw_start()
-            return
+        self.hud.set("gameover_best", round(self.leaderboard.high_score()))
+        self.hud.draw_text("gameover_best", rotation=cos(time.time() * 3) * 10)
 
-        if self.game_state == STATE_OVER:
-            self.draw_over()
-            return
+    def draw_profiler(self):
+        ## refreshing the text is not free, 4 times per second is enough
+        now = time.perf_counter()
+        if now >= self.time_next_profiler_refresh:
+            self.time_next_profiler_refresh = now + 0.25
+            self.text_profiler.text = "\n".join(self.profiler.report())
+        self.text_profiler.draw()
 
+    def on_draw(self):
+        with self.scene.activate() as target:
+            target.clear(color=self.window.background_color)
+            self.window.ctx.disable(self.window.ctx.DEPTH_TEST)
+
+            if self.sim.game_state == STATE_START:
+                self.draw_start()
+            elif self.sim.game_state == STATE_OVER:
+                self.draw_over()
+            else:
+                self.draw_playing()
+        self.scene.present()
+
+        ## without the profiler overlay
+        if self.screen_reader is not None:
+            self.screen_reader.read(self.frame_interval)
+
+        self.profiler.set('shapes', len(self.sim.shapes))
+        self.profiler.set('vertices', self.shape_renderer.vertices())
+        self.profiler.set('particles', len(self.sim.trailSystem))
+        ## since launch: game time skipped by the catch-up cap, probes answered by the gpu mask or not
+        self.profiler.set('dropped_ms', round(self.timestep.dropped * 1000))
+        if self.light_mask is not None:
+            self.profiler.set('mask_hits', self.light_mask.hits)
+            self.profiler.set('mask_misses', self.light_mask.misses)
+        if self.quality is not None:
+            for name, value in self.quality.values().items():
+                self.profiler.set(name, value)
+        if self.profiler.visible:
+            self.draw_profiler()
+        self.profiler.end_frame()
+
+        if self.first_frame:
+            self.first_frame = False
+            startup.mark("first frame")
+            if self.startup_report:
+                print("\n".join(startup.report()))
+        elif self.sim.game_state == STATE_START and self.hud.prepare():
+            ## the texts of the next screens, created one per frame while the player waits.
+            ## Those frames, and the interval after them, say nothing about the rendering
+            self.quality_skip = 2
+
+        if self.quality_skip:
+            self.quality_skip -= 1
+        elif self.quality is not None and self.frame_begin is not None:
+            self.quality.frame(self.frame_interval, time.perf_counter() - self.frame_begin)
+
+    def draw_playing(self):
         ## drawing text here so it can kills player >:p
-        ## draw HighScore
-        self.text_highscore.text = "HighScore: {}".format(round(self.time_since_start))
-        self.text_highscore.draw()
-
-        ## tutorial text
-        if self.time_since_start < 3:
-            self.text_tutorial.text = "Light kills you :)"
-        elif self.time_since_start < 5:
-            self.text_tutorial.text = ("WASD" if globals.keyboard == 'qwerty' else "ZQSD") + " for moving, Space to dash"
-        elif self.time_since_start < 7:
-            self.text_tutorial.text = "You are invicible while dashing"
-
-        if self.time_since_start < 7:
-            self.text_tutorial.draw()
-
-        self.window.ctx.flush()
+        with self.profiler.stage('hud'):
+            ## HighScore
+            self.hud.set("highscore", round(self.sim.time_since_start))
+
+            ## tutorial text
+            if self.sim.time_since_start < 3:
+                self.hud.set("tutorial", "Light kills you :)")
+            elif self.sim.time_since_start < 5:
+                self.hud.set("tutorial", ("WASD" if globals.keyboard == 'qwerty' else "ZQSD") + " for moving, Space to dash")
+            elif self.sim.time_since_start < 7:
+                self.hud.set("tutorial", "You are invicible while dashing")
+            else:
+                self.hud.show("tutorial", False)
 
-        glClear(GL_STENCIL_BUFFER_BIT)
-        glStencilMask(1)
-        glEnable(GL_COLOR_LOGIC_OP)
-        glLogicOp(GL_INVERT)
+            self.hud.draw()
+            self.profiler.count('draw_calls')
 
         self.render_shapes()
 
-        glDisable(GL_COLOR_LOGIC_OP)
+        ## hud texts are white under the shapes so they kill too
+        overlays = [self.hud.overlay("highscore")]
+        if self.hud["tutorial"].visible:
+            overlays.append(self.hud.overlay("tutorial"))
+        if overlays != self.sim.overlays:
+            self.sim.overlays = overlays
 
-        ## Dead if on whiteColor or out of screen
-        pixel_color = arcade.get_pixel(*self.player.pos)
-        if (not self.player.is_dashing and pixel_color[0] > 128) or\
-                not (0 < self.player.x < self.width and 0 < self.player.y < self.height):
-            self.game_state = STATE_OVER
-            # print("DEAD")
+        if self.light_mask is not None:
+            with self.profiler.stage('mask'):
+                self.light_mask.render(self.hud.draw, lambda: self.shape_renderer.render(self.projection))
+                self.light_mask.request(self.sim.player.x, self.sim.player.y)
 
         ## draw trail particles (trailSystem)
-        for p in self.trailSystem.particles:
-            alpha = max(0, min(255, map_range(p.lifetime, 0, 1, 0, 255)))
-            arcade.draw_point(p.x, p.y, color=(0, 255, 255, alpha), size=3)
-
-        ## draw player
-        if self.player.is_dashing:
-            arcade.draw_point(x=self.player.x, y=self.player.y, color=(0, 255, 255), size=self.player.scale)
-
-        else:
-            arcade.draw_point(x=self.player.x, y=self.player.y, color=(180, 0, 0) if self.player.dash_cooldown > 0 else (0, 180, 0), size=self.player.scale)
-
-        ## draw player's dash cooldown
-        if self.player.dash_cooldown > 0:
-            rect = arcade.XYWH(self.player.x, self.player.y+20, map_range(self.player.dash_cooldown, 0, self.player.max_dash_cooldown, 40, 0), 5)
-            arcade.draw_rect_filled(rect, color=(0, 255, 255))
-
-    def isOffScreen(self, shape, margin=1000):
-        margin=self.width * 3/4
-        #TODO: better would be to check if a shape is going to be offscreen
-        return shape.x < -margin - shape.scale or\
-            shape.x > margin + self.width + shape.scale or\
-            shape.y < -margin - shape.scale or\
-            shape.y > margin + self.height + shape.scale
+        with self.profiler.stage('particles'):
+            self.profiler.count('draw_calls', self.particle_renderer.render(self.sim.trailSystem, self.projection))
 
-    def on_update(self, delta_time):
-
-        ## do not do game logic if game not started
-        if self.game_state == STATE_START:
-            self.shapes[:] = (x for x in self.shapes if not self.isOffScreen(x))
-
-            self.time_next_shape -= delta_time
-            if self.time_next_shape <= 0.0:
-
-                if len(self.shapes) < 10:
-                    self.shapes.extend(self.generate_shapes(n=2))
-                    self.time_next_shape = self.max_time_next_shape
-
-            for shape in self.shapes:
-                shape.update(delta_time)
-
-        if self.game_state != STATE_PLAYING: return
-
-        ## add deltatime because highscore is the time you survived
-        self.time_since_start += delta_time
-
-        self.cooldown_increase_max_shapes -= delta_time
-        if self.cooldown_increase_max_shapes <= 0.0:
-            self.cooldown_increase_max_shapes = self.max_cooldown_increase_max_shapes
-            self.max_shapes += 1
-
-        self.player.update(delta_time)
-        if self.player.is_dashing:
-            self.trailSystem.spawn(*(self.player.pos + random_uniform_vec2() * 5.0))
+        with self.profiler.stage('player'):
+            ## draw player, between its last two positions
+            player = self.sim.player
+            x, y = player.lerp(self.timestep.alpha)
+            if player.is_dashing:
+                arcade.draw_point(x=x, y=y, color=(0, 255, 255), size=player.scale)
 
-        self.trailSystem.update(delta_time)
-
-        ## Remove shapes that are off bounds
-        self.shapes[:] = (x for x in self.shapes if not self.isOffScreen(x))
-
-        self.time_next_shape -= delta_time
-        if self.time_next_shape <= 0.0:
-
-            if len(self.shapes) < self.max_shapes:
-                self.shapes.extend(self.generate_shapes(n=1))
-                self.time_next_shape = self.max_time_next_shape
+            else:
+                arcade.draw_point(x=x, y=y, color=(180, 0, 0) if player.dash_cooldown > 0 else (0, 180, 0), size=player.scale)
+            self.profiler.count('draw_calls')
+
+            ## draw player's dash cooldown
+            if player.dash_cooldown > 0:
+                rect = arcade.XYWH(x, y+20, map_range(player.dash_cooldown, 0, player.max_dash_cooldown, 40, 0), 5)
+                arcade.draw_rect_filled(rect, color=(0, 255, 255))
+                self.profiler.count('draw_calls')
+
+    def save_run(self):
+        ## in the leaderboard and as replays/last.lidr, both written by the leaderboard's thread
+        ## which also serializes the recording: nothing steps it anymore
+        duration = time.perf_counter() - self.run_start if self.run_start is not None else 0.0
+        run = Run(self.sim.time_since_start, self.sim.seed, duration, globals.keyboard, replay=self.recorder.recording)
+        self.leaderboard.submit(run, replay_path=REPLAYS_PATH / "last.lidr")
 
-        for shape in self.shapes:
-            shape.update(delta_time)
+    def on_update(self, delta_time):
+        self.frame_begin = time.perf_counter()
+        self.frame_interval = delta_time
+        steps = self.timestep.advance(delta_time)
+        with self.profiler.stage('update'):
+            for _ in range(steps):
+                game_state = self.sim.game_state
+                if game_state == STATE_OVER: break
+                self.recorder.step(self.timestep.dt, self.inputs)
+
+                if game_state == STATE_START and self.sim.game_state == STATE_PLAYING:
+                    self.run_start = time.perf_counter()
+                if game_state == STATE_PLAYING and self.sim.game_state == STATE_OVER:
+                    self.save_run()
+        self.profiler.set('steps', steps)
 
     def on_key_press(self, key, key_modifiers):
         if key == arcade.key.ESCAPE:
             self.window.show_view(MenuView(self))
 
-        if key == arcade.key.SPACE:
-            if self.game_state == STATE_START:
-                self.game_state = STATE_PLAYING
-                self.shapes[:] = []
+        if key == arcade.key.F3:
+            self.profiler.toggle()
 
-            elif self.game_state == STATE_OVER:
+        if key == arcade.key.SPACE:
+            if self.sim.game_state == STATE_OVER:
                 self.setup()
+                ## space is still down, it must not start the new game right away
+                self.inputs &= ~INPUT_DASH
+                return
 
-        self.player.key_input(key, 1, key_modifiers)
+        self.inputs = key_input(self.inputs, key, ACTION_PRESS)
 
     def on_key_release(self, key, key_modifiers):
-        self.player.key_input(key, 0, key_modifiers)
+        self.inputs = key_input(self.inputs, key, ACTION_RELEASE)
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=SCREEN_TITLE)
+    parser.add_argument("--trace", help="write per-frame timings to this .csv or .jsonl file")
+    parser.add_argument("--tick-rate", type=int, default=TICK_RATE, help="simulation steps per second (default: %(default)s)")
+    parser.add_argument("--pixel-collision", action="store_true", help="die on the pixels drawn (read back from the gpu) instead of the shapes' geometry")
+    parser.add_argument("--disks", choices=('lod', 'analytic'), default='lod', help="disk geometry: segments by on-screen size, or quads cut round per pixel")
+    parser.add_argument("--target-fps", type=int, default=60, help="frames drawn per second, at most the display refresh rate, and the rate the quality is adapted to (default: %(default)s)")
+    parser.add_argument("--fixed-quality", action="store_true", help="never lower the quality, whatever the frame rate")
+    parser.add_argument("--export", metavar="PATH", help="record the frames: a directory of .ppm, a raw .rgb file, or a video file through ffmpeg")
+    parser.add_argument("--startup-report", action="store_true", help="print the time taken by each step from launch to the first frame")
+    args = parser.parse_args()
+
     window = arcade.Window(SCREEN_WIDTH, SCREEN_HEIGHT, SCREEN_TITLE, fullscreen=True, vsync=True)
     window.set_minimum_size(720, 480)
     window.set_mouse_visible(False)
-    # self.set_update_rate(1.0 / 60.0)
 
-    game_view = Game()
+    ## frames are drawn at the target rate, and with vsync no faster than the display refreshes
+    mode = window.screen.get_mode()
+    refresh_rate = getattr(mode, 'rate', 0) or 0
+    target_fps = min(args.target_fps, refresh_rate) if refresh_rate > 0 else args.target_fps
+    window.set_update_rate(1.0 / target_fps)
+    window.set_draw_rate(1.0 / target_fps)
+    startup.mark("window")
+
+    game_view = Game(tick_rate=args.tick_rate, pixel_collision=args.pixel_collision, disk_mode=args.disks,
+        target_fps=target_fps, adaptive=not args.fixed_quality, export=args.export)
+    game_view.startup_report = args.startup_report
+    startup.mark("game")
+    if args.trace:
+        game_view.profiler.open_trace(args.trace)
     window.show_view(game_view)
 
     arcade.run()
+    game_view.profiler.close_trace()
+    game_view.leaderboard.close()
+    if game_view.exporter is not None:
+        game_view.exporter.close()
+        print("exported {} frames, {} dropped and written as copies of the previous one".format(
+            game_view.exporter.written, game_view.exporter.dropped))
 
 # pyinstaller --onefile --noconsole --add-data "resources;resources" ./src/main.py
+# --onefile unpacks everything to a temporary directory at every launch, --onedir starts faster.
+# Timings of a build, unpacking included: build it with --console and run it with --startup-report
@@ -1,38 +1,73 @@
-from pyglet.math import Vec2
-from random import uniform
-from utils import random_uniform_vec2
+import numpy as np
+from math import cos, sin, tau
 
-class Particle:
-    def __init__(self, x, y):
-        self.pos = Vec2(x, y)
-        self.vel = random_uniform_vec2() * 0.5
-        self.lifetime = uniform(0.8, 1.2) #seconds
+SPEED = 30.0 #pixels per second at full lifetime
+
+class ParticleSystem:
+    ## Fixed capacity ring buffer of particles, when full the oldest particle is recycled.
+    ## A particle is dead once its lifetime reaches 0, its slot is simply left behind.
+    def __init__(self, capacity=4096, rng=None):
+        self.capacity = capacity
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.head = 0 ## next slot to write
+
+        ## x, y, lifetime: same layout as the renderer's vertex buffer
+        self.data = np.zeros((capacity, 3), dtype=np.float32)
+        self.vel = np.zeros((capacity, 2), dtype=np.float32)
+        self._pos = self.data[:, :2]
+        self._lifetime = self.data[:, 2:3]
+
+        ## scratch arrays so update() doesn't allocate
+        self._alive = np.zeros((capacity, 1), dtype=bool)
+        self._step = np.zeros((capacity, 2), dtype=np.float32)
 
     @property
-    def x(self):
-        return self.pos.x
+    def pos(self):
+        return self._pos
 
     @property
-    def y(self):
-        return self.pos.y
+    def lifetime(self):
+        return self.data[:, 2]
 
-    def is_dead(self):
-        return self.lifetime <= 0.0
+    def __len__(self):
+        return int(np.count_nonzero(self.lifetime > 0.0))
 
-    def update(self, delta_time):
-        self.pos += self.vel * self.lifetime
-        self.lifetime -= delta_time
-
-class ParticleSystem:
-    def __init__(self):
-        self.particles = []
+    def _random_vel(self, n):
+        ## random direction at SPEED
+        angle = self.rng.random(n) * tau
+        return np.stack((np.cos(angle) * SPEED, np.sin(angle) * SPEED), axis=1)
 
     def spawn(self, x, y):
-        self.particles.append(Particle(x, y))
+        ## scalars written in place, nothing allocated. Same distribution as _random_vel
+        i = self.head
+        data = self.data
+        data[i, 0] = x
+        data[i, 1] = y
+        data[i, 2] = self.rng.uniform(0.8, 1.2) #seconds
+        angle = self.rng.random() * tau
+        self.vel[i, 0] = cos(angle) * SPEED
+        self.vel[i, 1] = sin(angle) * SPEED
+        self.head = (i + 1) % self.capacity
+
+    def spawn_many(self, xs, ys):
+        xs = np.asarray(xs)[-self.capacity:]
+        ys = np.asarray(ys)[-self.capacity:]
+        n = len(xs)
+        if n == 0: return
+
+        slots = (self.head + np.arange(n)) % self.capacity
+        self.data[slots, 0] = xs
+        self.data[slots, 1] = ys
+        self.data[slots, 2] = self.rng.uniform(0.8, 1.2, n) #seconds
+        self.vel[slots] = self._random_vel(n)
+        self.head = (self.head + n) % self.capacity
 
     def update(self, delta_time):
-        ## remove dead particles
-        self.particles[:] = (x for x in self.particles if not x.is_dead())
+        lifetime = self._lifetime
+        alive = self._alive
+        np.greater(lifetime, 0.0, out=alive)
 
-        for p in self.particles:
-            p.update(delta_time)
+        np.multiply(self.vel, lifetime, out=self._step)
+        np.multiply(self._step, delta_time, out=self._step)
+        np.add(self._pos, self._step, out=self._pos, where=alive)
+        np.subtract(lifetime, delta_time, out=lifetime, where=alive)
@@ -1,139 +1,99 @@
-from pyglet.math import Vec2
-from pyglet.window import key as Keys
-import globals
+from math import sqrt
 
-ACTION_PRESS = 1
-ACTION_RELEASE = 0
+## what the player is asked to do during a step, as bit flags
+INPUT_UP = 1 << 0
+INPUT_DOWN = 1 << 1
+INPUT_LEFT = 1 << 2
+INPUT_RIGHT = 1 << 3
+INPUT_DASH = 1 << 4
 
 class Player:
+    ## plain floats in slots, update() allocates nothing.
+    ## The math is the one of pyglet's Vec2 (length as sqrt(x ** 2 + y ** 2), ...)
+    ## so recorded runs replay the same.
+    __slots__ = (
+        'x', 'y', 'prev_x', 'prev_y', 'vx', 'vy',
+        'speed', 'dash_mult', 'scale', 'inputs', 'is_dashing',
+        'max_dash_cooldown', 'dash_cooldown', 'dash_stamina', 'dash_stamina_drain',
+    )
+
     def __init__(self, x, y):
-        self.pos = Vec2(x, y)
-        self.vel = Vec2(0.0, 0.0)
+        self.x = x
+        self.y = y
+        self.prev_x = x ## before the last update, for drawing between two steps
+        self.prev_y = y
+        self.vx = 0.0
+        self.vy = 0.0
 
         self.speed = 240.0
         self.dash_mult = 2.2
         self.scale = 15
 
-        self.move_up = False
-        self.move_down = False
-        self.move_left = False
-        self.move_right = False
-
-        self.dash_dir = Vec2(0.0, 0.0)
-        self.dash = False ## is space pressed
+        self.inputs = 0 ## INPUT_* flags
         self.is_dashing = False ## is character currently dashing
 
         self.max_dash_cooldown = 0.5 #seconds
         self.dash_cooldown = self.max_dash_cooldown
 
         self.dash_stamina = 1.0 #0.0 -> 1.0
+        self.dash_stamina_drain = 0.72 #per second
 
     @property
-    def x(self):
-        return self.pos.x
-
-    @property
-    def y(self):
-        return self.pos.y
+    def dash(self):
+        ## is space pressed
+        return bool(self.inputs & INPUT_DASH)
 
     def update(self, delta_time):
+        inputs = self.inputs
+        dash = inputs & INPUT_DASH
+
         ### Dash
         ## if dash pressed && cooldown finished && is moving
-        if self.dash and self.dash_cooldown <= 0 and self.vel.length() > 0:
+        if dash and self.dash_cooldown <= 0 and (self.vx or self.vy):
             self.is_dashing = True
 
         ## update dash_stamina
         if self.is_dashing:
             self.dash_cooldown = self.max_dash_cooldown
-            self.dash_stamina = max(0, self.dash_stamina - 0.012)
+            self.dash_stamina = max(0, self.dash_stamina - self.dash_stamina_drain * delta_time)
         ## update cooldown if not dashing
         else:
             self.dash_stamina = 1.0
             self.dash_cooldown = max(0, self.dash_cooldown - delta_time)
 
-        ## stop dash if runs out of stamina
         ## if dash button not pressed, stop dash
-        # if (self.dash_stamina <= 0) or (not self.dash and self.is_dashing):
-        if not self.dash and self.is_dashing:
+        if not dash and self.is_dashing:
             self.is_dashing = False
 
-        # print(self.dash, self.is_dashing, self.dash_cooldown)
-
-        if not self.is_dashing:
+        if self.is_dashing:
+            ## keeps going the same way
+            vx, vy = self.vx, self.vy
+        else:
             ## ZQSD Movements
-            self.vel = Vec2(0.0, 0.0)
-
-            if self.move_up:
-                self.vel += Vec2(0.0, 1.0)
-            if self.move_down:
-                self.vel -= Vec2(0.0, 1.0)
-            if self.move_left:
-                self.vel -= Vec2(1.0, 0.0)
-            if self.move_right:
-                self.vel += Vec2(1.0, 0.0)
+            vx = (-1.0 if inputs & INPUT_LEFT else 0.0) + (1.0 if inputs & INPUT_RIGHT else 0.0)
+            vy = (1.0 if inputs & INPUT_UP else 0.0) - (1.0 if inputs & INPUT_DOWN else 0.0)
 
         ## Apply vel ...
-        if self.vel.length() > 0.001:
-            self.vel = self.vel.normalize()
+        length = sqrt(vx ** 2 + vy ** 2)
+        if length > 0.001:
+            vx /= length
+            vy /= length
 
         if self.is_dashing:
-            self.vel *= self.dash_mult
-
-        self.pos += self.vel * self.speed * delta_time
-
-    def key_input(self, key, action, modifiers):
-        ## Up
-        if not globals.keyboard in ('azerty', 'qwerty'):
-            print('Invalide keyboard')
-            exit()
-
-        mappings = {
-            'qwerty': {
-                'up': Keys.W,
-                'left': Keys.A,
-                'down': Keys.S,
-                'right': Keys.D,
-            },
-            'azerty': {
-                'up': Keys.Z,
-                'left': Keys.Q,
-                'down': Keys.S,
-                'right': Keys.D,
-            }
-        }
-
-        mapping = mappings[globals.keyboard]
-
-        if key == mapping['up']:
-            if action == ACTION_PRESS:
-                self.move_up = True
-            elif action == ACTION_RELEASE:
-                self.move_up = False
-
-        ## Right
-        if key == mapping['right']:
-            if action == ACTION_PRESS:
-                self.move_right = True
-            elif action == ACTION_RELEASE:
-                self.move_right = False
-
-        ## Left
-        if key == mapping['left']:
-            if action == ACTION_PRESS:
-                self.move_left = True
-            elif action == ACTION_RELEASE:
-                self.move_left = False
-
-        ## Down
-        if key == mapping['down']:
-            if action == ACTION_PRESS:
-                self.move_down = True
-            elif action == ACTION_RELEASE:
-                self.move_down = False
-
-        ## Dash
-        elif key == Keys.SPACE:
-            if action == ACTION_PRESS:
-                self.dash = True
-            elif action == ACTION_RELEASE:
-                self.dash = False
+            vx *= self.dash_mult
+            vy *= self.dash_mult
+
+        self.vx = vx
+        self.vy = vy
+        self.prev_x = self.x
+        self.prev_y = self.y
+        self.x += vx * self.speed * delta_time
+        self.y += vy * self.speed * delta_time
+
+    def lerp(self, alpha):
+        ## position drawn at alpha (0 -> 1) of the way from the last update to the next one
+        return (self.prev_x + alpha * (self.x - self.prev_x), self.prev_y + alpha * (self.y - self.prev_y))
+
+    def set_inputs(self, inputs):
+        ## inputs: INPUT_* flags
+        self.inputs = inputs
@@ -0,0 +1,142 @@
+import csv
+import json
+import time
+from collections import deque
+
+## Per-frame timings of the game stages, with rolling percentiles and an optional trace file.
+## Disabled, every call is a cheap no-op so the hooks can stay in the hot path.
+
+class _Stage:
+    __slots__ = ('profiler', 'name', 'start')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        frame = self.profiler.frame
+        frame[self.name] = frame.get(self.name, 0.0) + elapsed
+
+class _NullStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+NULL_STAGE = _NullStage()
+
+def percentile(sorted_values, p):
+    if not sorted_values: return 0.0
+    i = min(len(sorted_values) - 1, int(round(p / 100 * (len(sorted_values) - 1))))
+    return sorted_values[i]
+
+class FrameProfiler:
+    def __init__(self, stages, counters, window=300):
+        self.stages = tuple(stages)
+        self.counters = tuple(counters)
+        self.visible = False ## on-screen overlay
+        self.enabled = False ## measuring, for the overlay or the trace
+
+        self._stages = {name: _Stage(self, name) for name in self.stages}
+        self.history = {name: deque(maxlen=window) for name in ('frame',) + self.stages}
+        self.frame = {} ## seconds spent in each stage this frame
+        self.values = {} ## counters of this frame
+        self.last_values = {}
+
+        self.frame_index = 0
+        self.frame_start = None
+
+        self.trace = None
+        self.trace_writer = None
+
+    def toggle(self):
+        self.visible = not self.visible
+        self.enabled = self.visible or self.trace is not None
+        self.frame_start = None
+
+    def stage(self, name):
+        if not self.enabled:
+            return NULL_STAGE
+        return self._stages[name]
+
+    def count(self, name, value=1):
+        if self.enabled:
+            self.values[name] = self.values.get(name, 0) + value
+
+    def set(self, name, value):
+        if self.enabled:
+            self.values[name] = value
+
+    def end_frame(self):
+        ## call once per frame, the frame time is measured between two calls
+        if not self.enabled: return
+
+        now = time.perf_counter()
+        if self.frame_start is not None:
+            self.history['frame'].append(now - self.frame_start)
+            for name in self.stages:
+                self.history[name].append(self.frame.get(name, 0.0))
+
+            if self.trace is not None:
+                self.write_trace(now - self.frame_start)
+
+        self.frame_start = now
+        self.frame_index += 1
+        self.frame = {}
+        self.last_values = self.values
+        self.values = {}
+
+    def percentiles(self, name, ps=(50, 99)):
+        ## in milliseconds
+        values = sorted(self.history[name])
+        return [percentile(values, p) * 1000 for p in ps]
+
+    def report(self):
+        lines = []
+        p50, p99 = self.percentiles('frame')
+        lines.append("frame  p50 {:6.2f}ms  p99 {:6.2f}ms".format(p50, p99))
+        for name in self.stages:
+            p50, p99 = self.percentiles(name)
+            lines.append("{:<6} p50 {:6.2f}ms  p99 {:6.2f}ms".format(name[:6], p50, p99))
+        lines.append("  ".join("{} {}".format(name, self.last_values.get(name, 0)) for name in self.counters))
+        return lines
+
+    ## Trace file
+
+    def open_trace(self, path):
+        ## .csv or .jsonl, one line per frame
+        self.close_trace()
+        self.enabled = True
+        self.trace = open(path, 'w', newline='')
+        if str(path).endswith('.csv'):
+            fields = ['frame', 'frame_ms'] + [name + '_ms' for name in self.stages] + list(self.counters)
+            self.trace_writer = csv.DictWriter(self.trace, fieldnames=fields, extrasaction='ignore')
+            self.trace_writer.writeheader()
+
+    def write_trace(self, frame_time):
+        row = {'frame': self.frame_index, 'frame_ms': round(frame_time * 1000, 4)}
+        for name in self.stages:
+            row[name + '_ms'] = round(self.frame.get(name, 0.0) * 1000, 4)
+        for name in self.counters:
+            row[name] = self.values.get(name, 0)
+
+        if self.trace_writer is not None:
+            self.trace_writer.writerow(row)
+        else:
+            self.trace.write(json.dumps(row) + '\n')
+
+    def close_trace(self):
+        if self.trace is not None:
+            self.trace.close()
+        self.trace = None
+        self.trace_writer = None
+        self.enabled = self.visible
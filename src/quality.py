@@ -0,0 +1,109 @@
+import time
+from collections import deque
+from profiler import percentile
+
+## Frame budget controller: lowers quality knobs one step at a time while frames miss
+## the target rate, and raises them back, slowly, once frames leave enough headroom.
+## Knobs are lowered in the order given and raised in the reverse order, so the
+## cheapest looking ones go first. Every change is kept in `decisions`.
+##
+## Two measures per frame: the interval between frames (what the player sees, with
+## vsync it can't go under the refresh period) and the time spent in on_update +
+## on_draw (the headroom, the gpu isn't in it).
+
+class Knob:
+    def __init__(self, name, levels, apply):
+        self.name = name
+        self.levels = tuple(levels) ## best quality first
+        self.apply = apply ## called with the new value
+        self.level = 0
+
+    @property
+    def value(self):
+        return self.levels[self.level]
+
+    def set_level(self, level):
+        self.level = level
+        self.apply(self.value)
+
+class QualityController:
+    def __init__(self, knobs, target_fps=60, window=30, cooldown=0.5, raise_after=2.0, over=1.15, under=0.6):
+        self.knobs = list(knobs)
+        self.budget = 1.0 / target_fps
+        self.window = window ## frames measured before any decision
+        self.cooldown = cooldown ## seconds between two decisions
+        self.raise_after = raise_after ## seconds of headroom before raising a knob
+        self.over = over ## frames longer than budget * over are missed
+        self.under = under ## busy under budget * under is headroom
+
+        self.intervals = deque(maxlen=window)
+        self.busy = deque(maxlen=window)
+        self.time = 0.0
+        self.next_decision = 0.0
+        self.headroom_since = None
+        self.last_raise = None
+
+        self.decisions = deque(maxlen=256) ## dicts, see decide()
+        self.on_decision = None ## optional callback(decision)
+
+    def values(self):
+        return {knob.name: knob.value for knob in self.knobs}
+
+    def frame(self, interval, busy):
+        ## once per frame, in seconds. Returns the decision taken, if any
+        self.time += interval
+        self.intervals.append(interval)
+        self.busy.append(busy)
+        if len(self.intervals) < self.window or self.time < self.next_decision:
+            return None
+
+        interval_p90 = percentile(sorted(self.intervals), 90)
+        busy_p90 = percentile(sorted(self.busy), 90)
+
+        if interval_p90 > self.budget * self.over:
+            self.headroom_since = None
+            ## lowered right after a raise: that level was too much, wait longer next time
+            if self.last_raise is not None and self.time - self.last_raise < self.raise_after * 2:
+                self.raise_after *= 2
+            for knob in self.knobs:
+                if knob.level < len(knob.levels) - 1:
+                    return self.decide(knob, knob.level + 1, interval_p90, busy_p90)
+            return None
+
+        if busy_p90 < self.budget * self.under and interval_p90 <= self.budget * self.over:
+            if self.headroom_since is None:
+                self.headroom_since = self.time
+            if self.time - self.headroom_since >= self.raise_after:
+                self.headroom_since = None
+                for knob in reversed(self.knobs):
+                    if knob.level > 0:
+                        self.last_raise = self.time
+                        return self.decide(knob, knob.level - 1, interval_p90, busy_p90)
+        else:
+            self.headroom_since = None
+        return None
+
+    def decide(self, knob, level, interval_p90, busy_p90):
+        previous = knob.value
+        knob.set_level(level)
+
+        decision = {
+            'time': round(self.time, 3),
+            'wall_time': time.time(),
+            'knob': knob.name,
+            'from': previous,
+            'to': knob.value,
+            'frame_p90_ms': round(interval_p90 * 1000, 2),
+            'busy_p90_ms': round(busy_p90 * 1000, 2),
+            'budget_ms': round(self.budget * 1000, 2),
+        }
+        self.decisions.append(decision)
+
+        ## measures taken before the change say nothing about the new level
+        self.intervals.clear()
+        self.busy.clear()
+        self.next_decision = self.time + self.cooldown
+
+        if self.on_decision is not None:
+            self.on_decision(decision)
+        return decision
@@ -0,0 +1,215 @@
+import arcade
+import numpy as np
+from pyglet.gl import GL_PROGRAM_POINT_SIZE
+from shapes import ShapeBuilder, MAX_DISK_SEGMENTS, DISK_MAX_ERROR
+from shapefield import SHAPE_QUAD, SHAPE_DISK
+from resources import get_resources
+
+## x, y, angle, scale
+INSTANCE_FORMAT = '2f 1f 1f'
+INSTANCE_ATTRIBUTES = ['in_pos', 'in_angle', 'in_scale']
+INSTANCE_FLOATS = 4
+
+class InstancedMesh:
+    ## one vertex buffer shared by every instance + one growable instance buffer
+    def __init__(self, ctx, vbo, mode, capacity=64):
+        self.ctx = ctx
+        self.capacity = capacity
+        self.instances = 0
+
+        self.vbo = vbo
+        self.instance_buffer = ctx.buffer(reserve=capacity * INSTANCE_FLOATS * 4, usage='stream')
+
+        self.geometry = ctx.geometry([
+            arcade.gl.BufferDescription(self.vbo, '2f', ['in_vert']),
+            arcade.gl.BufferDescription(self.instance_buffer, INSTANCE_FORMAT, INSTANCE_ATTRIBUTES, instanced=True),
+        ], mode=mode)
+
+    def write(self, data, count):
+        ## data is anything exposing the buffer protocol, packed as INSTANCE_FORMAT
+        if count > self.capacity:
+            while self.capacity < count:
+                self.capacity *= 2
+            self.instance_buffer.orphan(size=self.capacity * INSTANCE_FLOATS * 4)
+
+        if count > 0:
+            self.instance_buffer.write(data)
+        self.instances = count
+
+    def render(self, program):
+        if self.instances > 0:
+            self.geometry.render(program, instances=self.instances)
+            return 1
+        return 0
+
+class ShapeRenderer:
+    ## draws every shape instanced: one draw call for the quads, and for the disks either
+    ## one per level of detail in use ('lod', segments chosen by on-screen radius, the disks
+    ## too big for max_disk_segments drawn analytic) or a single one of quads cut round by
+    ## the fragment shader ('analytic')
+    def __init__(self, ctx, disk_mode='lod', max_disk_segments=MAX_DISK_SEGMENTS, pixel_scale=1.0):
+        self.ctx = ctx
+        self.resources = get_resources(ctx)
+        self.program = self.resources.program('shape')
+        self.disk_program = None ## compiled the first time analytic disks are drawn
+
+        self.disk_mode = disk_mode
+        self.max_disk_segments = max_disk_segments ## can change at any time, read by upload()
+        self.max_error = DISK_MAX_ERROR ## pixels
+        self.pixel_scale = pixel_scale ## framebuffer pixels per unit of the projection
+
+        self.quads = InstancedMesh(ctx, self.resources.vertex_buffer('quad', ShapeBuilder.quad), ctx.TRIANGLES)
+        self.disk_quads = InstancedMesh(ctx, self.resources.vertex_buffer('disk_quad', ShapeBuilder.disk_quad), ctx.TRIANGLES)
+        self.disks = {} ## segments -> InstancedMesh, created the first time a level is used
+
+        ## disks drawn per level last upload, for the profiler
+        self.disk_counts = {}
+
+    def disk_mesh(self, segments):
+        mesh = self.disks.get(segments)
+        if mesh is None:
+            vbo = self.resources.vertex_buffer('disk%d' % segments, lambda: ShapeBuilder.disk(segments))
+            mesh = self.disks[segments] = InstancedMesh(self.ctx, vbo, self.ctx.TRIANGLE_FAN)
+        return mesh
+
+    def upload(self, shapes, alpha=1.0):
+        ## shapes is a ShapeField, its instance rows are already packed as INSTANCE_FORMAT
+        quads = shapes.instances_of(SHAPE_QUAD, alpha)
+        self.quads.write(quads, len(quads))
+
+        disks = shapes.instances_of(SHAPE_DISK, alpha)
+        for mesh in self.disks.values():
+            mesh.instances = 0
+        self.disk_quads.instances = 0
+
+        if self.disk_mode == 'analytic':
+            self.disk_quads.write(disks, len(disks))
+            self.disk_counts = {'analytic': len(disks)}
+            return
+
+        ## sorted by level, each level is a contiguous run of rows. A disk needing more segments
+        ## than max_disk_segments would be drawn visibly inside the circle the player dies in
+        ## (collision.py): those are cut round by the fragment shader instead, last run
+        levels = ShapeBuilder.disk_levels(self.max_disk_segments)
+        segments = ShapeBuilder.disk_segments(disks[:, 3] * self.pixel_scale, self.max_error, np.inf)
+        level = np.searchsorted(levels, segments) ## len(levels): analytic
+        counts = np.bincount(level, minlength=len(levels) + 1)
+        disks = disks[np.argsort(level, kind='stable')]
+
+        self.disk_counts = {}
+        start = 0
+        for segments, count in zip(levels, counts.tolist()):
+            if count == 0: continue
+            self.disk_mesh(segments).write(disks[start:start + count], count)
+            self.disk_counts[segments] = count
+            start += count
+
+        analytic = int(counts[-1])
+        if analytic > 0:
+            self.disk_quads.write(disks[start:], analytic)
+            self.disk_counts['analytic'] = analytic
+
+    def vertices(self):
+        ## vertices processed by the last upload's draw calls
+        return 6 * (self.quads.instances + self.disk_quads.instances) +\
+            sum(segments * mesh.instances for segments, mesh in self.disks.items())
+
+    def render(self, projection):
+        ## inverts the colors under every shape, so overlapping shapes cancel out (xor):
+        ## the shapes are white and blended as dst = 1 - dst, destination alpha untouched.
+        ## returns the number of draw calls
+        ctx = self.ctx
+        self.program['u_projectionMatrix'] = projection
+
+        blend_func = ctx.blend_func
+        ctx.blend_func = (ctx.ONE_MINUS_DST_COLOR, ctx.ZERO, ctx.ZERO, ctx.ONE)
+        with ctx.enabled(ctx.BLEND):
+            draw_calls = self.quads.render(self.program)
+            draw_calls += sum(mesh.render(self.program) for mesh in self.disks.values())
+            if self.disk_quads.instances > 0:
+                if self.disk_program is None:
+                    self.disk_program = self.resources.program('disk')
+                self.disk_program['u_projectionMatrix'] = projection
+                draw_calls += self.disk_quads.render(self.disk_program)
+        ctx.blend_func = blend_func
+        return draw_calls
+
+class ParticleRenderer:
+    ## draws a whole ParticleSystem as points with one upload and one draw call
+    def __init__(self, ctx, capacity=4096):
+        self.ctx = ctx
+        self.capacity = capacity
+        self.max_particles = capacity ## only the newest ones are drawn, can change at any time
+        self.program = None ## compiled the first time particles are drawn, not before the game starts
+
+        self.vbo = ctx.buffer(reserve=capacity * 3 * 4, usage='stream')
+        self.geometry = ctx.geometry([
+            arcade.gl.BufferDescription(self.vbo, '2f 1f', ['in_pos', 'in_lifetime']),
+        ], mode=ctx.POINTS)
+
+    def render(self, particles, projection, color=(0.0, 1.0, 1.0), size=3):
+        if particles.capacity != self.capacity:
+            self.capacity = particles.capacity
+            self.vbo.orphan(size=self.capacity * 3 * 4)
+
+        ## the max_particles slots written last, one or two runs of the ring buffer.
+        ## Dead slots are uploaded too and dropped by the vertex shader,
+        ## so the cost only depends on max_particles
+        count = min(self.max_particles, self.capacity)
+        start = (particles.head - count) % self.capacity
+        runs = [(start, min(count, self.capacity - start))]
+        if runs[0][1] < count:
+            runs.append((0, count - runs[0][1]))
+
+        for first, vertices in runs:
+            self.vbo.write(particles.data[first:first + vertices], offset=first * 3 * 4)
+
+        if self.program is None:
+            self.program = get_resources(self.ctx).program('particle')
+        self.program['u_projectionMatrix'] = projection
+        self.program['u_color'] = color
+        self.program['u_size'] = size
+
+        with self.ctx.enabled(self.ctx.BLEND, GL_PROGRAM_POINT_SIZE):
+            for first, vertices in runs:
+                self.geometry.render(self.program, first=first, vertices=vertices)
+        return len(runs)
+
+class ScaledScreen:
+    ## frames drawn at `scale` of the screen resolution into a framebuffer, then stretched
+    ## on the screen by one textured quad. At scale 1 everything goes straight to the screen.
+    def __init__(self, ctx, scale=1.0):
+        self.ctx = ctx
+        self.scale = scale ## can change at any time, read by activate()
+        self.framebuffer = None
+        ## only needed once the scale is lowered, created then
+        self.program = None
+        self.quad = None
+
+    def target(self):
+        if self.scale >= 1.0:
+            return self.ctx.screen
+
+        width, height = self.ctx.screen.size
+        size = (max(1, int(width * self.scale)), max(1, int(height * self.scale)))
+        if self.framebuffer is None or self.framebuffer.size != size:
+            texture = self.ctx.texture(size, components=4, filter=(self.ctx.LINEAR, self.ctx.LINEAR))
+            self.framebuffer = self.ctx.framebuffer(color_attachments=[texture])
+        return self.framebuffer
+
+    def activate(self):
+        return self.target().activate()
+
+    def present(self):
+        ## stretches the frame on the screen, nothing to do at scale 1
+        framebuffer = self.target()
+        if framebuffer is self.ctx.screen: return
+
+        if self.program is None:
+            self.program = get_resources(self.ctx).program('blit')
+            self.quad = arcade.gl.geometry.quad_2d_fs()
+
+        framebuffer.color_attachments[0].use(0)
+        self.program['u_texture'] = 0
+        with self.ctx.screen.activate(), self.ctx.enabled_only():
+            self.quad.render(self.program)
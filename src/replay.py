@@ -0,0 +1,209 @@
+#! /usr/bin/python3
+
+## Recording of a run (seed + inputs of every tick) and headless replay.
+##   python src/replay.py run.lidr        # re-simulate and check the score
+
+import struct
+import sys
+import time
+import zlib
+from array import array
+
+import numpy as np
+
+from simulation import Simulation, STATE_OVER
+from collision import Overlay
+
+MAGIC = b'LIDR'
+VERSION = 3 ## 1 and 2 drew the trail from the game's generator, they can't be replayed
+
+## magic, version, seed, width, height, ticks, score
+HEADER = struct.Struct('<4sBQHHId')
+INPUT_EVENT = struct.Struct('<IB') ## tick, inputs
+OVERLAY_EVENT = struct.Struct('<IB') ## tick, number of overlays, followed by the overlays
+RECT = struct.Struct('<4d')
+MASK = struct.Struct('<BiiHH') ## has a mask, origin x, y, width, height, followed by the mask's bits
+COUNT = struct.Struct('<I')
+
+class ReplayError(Exception):
+    pass
+
+class Recording:
+    def __init__(self, seed, width, height):
+        self.seed = seed
+        self.width = width
+        self.height = height
+        self.score = 0.0
+
+        self.dts = array('d') ## delta_time of every tick
+        self.input_events = [] ## (tick, inputs) when the inputs change
+        self.overlay_events = [] ## (tick, overlays) when the overlays change
+
+    @property
+    def ticks(self):
+        return len(self.dts)
+
+    def to_bytes(self):
+        body = bytearray(self.dts.tobytes())
+
+        body += COUNT.pack(len(self.input_events))
+        for tick, inputs in self.input_events:
+            body += INPUT_EVENT.pack(tick, inputs)
+
+        body += COUNT.pack(len(self.overlay_events))
+        for tick, overlays in self.overlay_events:
+            body += OVERLAY_EVENT.pack(tick, len(overlays))
+            for overlay in overlays:
+                body += RECT.pack(*overlay.rect)
+                if overlay.mask is None:
+                    body += MASK.pack(0, 0, 0, 0, 0)
+                    continue
+                height, width = overlay.mask.shape
+                body += MASK.pack(1, overlay.origin[0], overlay.origin[1], width, height)
+                body += np.packbits(overlay.mask, axis=None).tobytes()
+
+        header = HEADER.pack(MAGIC, VERSION, self.seed, self.width, self.height, self.ticks, self.score)
+        return header + zlib.compress(bytes(body))
+
+    @classmethod
+    def from_bytes(cls, data):
+        if len(data) < HEADER.size:
+            raise ReplayError("truncated recording")
+
+        magic, version, seed, width, height, ticks, score = HEADER.unpack_from(data)
+        if magic != MAGIC:
+            raise ReplayError("not a recording")
+        if version in (1, 2):
+            raise ReplayError("recording version {} drew the trail particles from the game's random numbers, it can't be replayed".format(version))
+        if version != VERSION:
+            raise ReplayError("unsupported recording version {}".format(version))
+
+        try:
+            body = zlib.decompress(data[HEADER.size:])
+        except zlib.error as e:
+            raise ReplayError("corrupted recording: {}".format(e))
+
+        recording = cls(seed, width, height)
+        recording.score = score
+
+        offset = ticks * 8
+        recording.dts.frombytes(body[:offset])
+
+        (n,) = COUNT.unpack_from(body, offset)
+        offset += COUNT.size
+        for _ in range(n):
+            recording.input_events.append(INPUT_EVENT.unpack_from(body, offset))
+            offset += INPUT_EVENT.size
+
+        (n,) = COUNT.unpack_from(body, offset)
+        offset += COUNT.size
+        for _ in range(n):
+            tick, count = OVERLAY_EVENT.unpack_from(body, offset)
+            offset += OVERLAY_EVENT.size
+            overlays = []
+            for _ in range(count):
+                rect = RECT.unpack_from(body, offset)
+                offset += RECT.size
+                has_mask, x, y, width, height = MASK.unpack_from(body, offset)
+                offset += MASK.size
+                if not has_mask:
+                    overlays.append(Overlay(rect))
+                    continue
+                size = (width * height + 7) // 8
+                bits = np.frombuffer(body, dtype=np.uint8, count=size, offset=offset)
+                offset += size
+                mask = np.unpackbits(bits, count=width * height).astype(bool).reshape(height, width)
+                overlays.append(Overlay(rect, (x, y), mask))
+            recording.overlay_events.append((tick, overlays))
+
+        return recording
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            f.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            return cls.from_bytes(f.read())
+
+class Recorder:
+    ## steps a Simulation and records everything needed to replay it
+    def __init__(self, sim):
+        self.sim = sim
+        self.recording = Recording(sim.seed, int(sim.width), int(sim.height))
+        self.inputs = 0
+        self.overlays = []
+
+    def step(self, delta_time, inputs):
+        recording = self.recording
+        tick = recording.ticks
+
+        if inputs != self.inputs or tick == 0:
+            recording.input_events.append((tick, inputs))
+            self.inputs = inputs
+
+        if self.sim.overlays != self.overlays:
+            self.overlays = list(self.sim.overlays)
+            recording.overlay_events.append((tick, self.overlays))
+
+        recording.dts.append(delta_time)
+        self.sim.step(delta_time, inputs)
+        recording.score = self.sim.time_since_start
+
+def replay(recording, verify=True):
+    ## re-simulates the recording as fast as possible, returns the Simulation
+    for sim in frames(recording):
+        pass
+
+    if verify and sim.time_since_start != recording.score:
+        raise ReplayError("score mismatch: recorded {} but replayed {}".format(recording.score, sim.time_since_start))
+
+    return sim
+
+def frames(recording):
+    ## yields the Simulation after every tick of the recording (the same object every time)
+    sim = Simulation(recording.width, recording.height, seed=recording.seed)
+    if recording.ticks == 0:
+        yield sim
+
+    inputs = 0
+    input_events = iter(recording.input_events)
+    overlay_events = iter(recording.overlay_events)
+    next_input = next(input_events, None)
+    next_overlay = next(overlay_events, None)
+
+    for tick, delta_time in enumerate(recording.dts):
+        while next_input is not None and next_input[0] == tick:
+            inputs = next_input[1]
+            next_input = next(input_events, None)
+
+        while next_overlay is not None and next_overlay[0] == tick:
+            sim.overlays = list(next_overlay[1])
+            next_overlay = next(overlay_events, None)
+
+        sim.step(delta_time, inputs)
+        yield sim
+
+def main():
+    if len(sys.argv) != 2:
+        print("usage: replay.py <recording>")
+        sys.exit(2)
+
+    recording = Recording.load(sys.argv[1])
+
+    t = time.perf_counter()
+    try:
+        sim = replay(recording)
+    except ReplayError as e:
+        print("INVALID: {}".format(e))
+        sys.exit(1)
+    elapsed = time.perf_counter() - t
+
+    game_time = sum(recording.dts)
+    print("seed {} | {} ticks | score {:.3f} | game over: {}".format(
+        recording.seed, recording.ticks, sim.time_since_start, sim.game_state == STATE_OVER))
+    print("replayed in {:.2f}s ({:.0f}x real time)".format(elapsed, game_time / max(elapsed, 1e-9)))
+
+if __name__ == "__main__":
+    main()
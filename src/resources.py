@@ -0,0 +1,38 @@
+from pathlib import Path
+import sys
+import weakref
+
+## next to src/, or where a pyinstaller build unpacked its data (--add-data "resources;resources")
+ASSETS_PATH = Path(getattr(sys, '_MEIPASS', Path(__file__).parent.parent)).resolve() / "resources"
+
+## GPU resources are created once per gl context and shared by everything drawing in it,
+## restarting a game doesn't allocate any of them again.
+_registries = weakref.WeakKeyDictionary()
+
+def get_resources(ctx):
+    resources = _registries.get(ctx)
+    if resources is None:
+        resources = _registries[ctx] = Resources(ctx)
+    return resources
+
+class Resources:
+    def __init__(self, ctx):
+        self.ctx = ctx
+        self.programs = {}
+        self.buffers = {}
+
+    def program(self, name):
+        ## resources/<name>.vert + resources/<name>.frag, compiled and linked once
+        program = self.programs.get(name)
+        if program is None:
+            program = self.programs[name] = self.ctx.program(
+                vertex_shader=(ASSETS_PATH / (name + ".vert")).read_text(),
+                fragment_shader=(ASSETS_PATH / (name + ".frag")).read_text())
+        return program
+
+    def vertex_buffer(self, name, build):
+        ## static vertex data, build() returns packed floats (see ShapeBuilder) and only runs the first time
+        buffer = self.buffers.get(name)
+        if buffer is None:
+            buffer = self.buffers[name] = self.ctx.buffer(data=build())
+        return buffer
@@ -0,0 +1,207 @@
+import heapq
+import numpy as np
+from math import tau
+from spatial import SpatialGrid
+
+SHAPE_QUAD = 0
+SHAPE_DISK = 1
+
+def random_shapes(rng, n, width, height, speed_range, scale_range):
+    ## x, y, angle, scale, dir, speed, kind of n new shapes, float64
+    w, h = width, height
+
+    ## coming offscreen to somewhere into the screen
+    v = rng.uniform(-1.0, 1.0, (n, 2))
+    v /= np.maximum(np.hypot(v[:, 0], v[:, 1]), 1e-9)[:, None]
+    x = v[:, 0] * w + w/2
+    y = v[:, 1] * w + h/2
+
+    ## point in screen to get direction
+    px = rng.uniform(0, w, n)
+    py = rng.uniform(0, h, n)
+    dir = np.arctan2(py - y, px - x)
+
+    speed = rng.uniform(*speed_range, n)
+    angle = rng.uniform(0, tau, n)
+    scale = rng.uniform(*scale_range, n)
+    kind = rng.integers(0, 2, n)
+    return x, y, angle, scale, dir, speed, kind
+
+def exit_time(x, y, scale, vx, vy, rect):
+    ## seconds until shapes moving at (vx, vy) are fully outside rect (left, bottom, right, top)
+    left, bottom, right, top = rect
+    with np.errstate(divide='ignore', invalid='ignore'):
+        tx = np.where(vx > 0, (right + scale - x) / vx, np.where(vx < 0, (left - scale - x) / vx, np.inf))
+        ty = np.where(vy > 0, (top + scale - y) / vy, np.where(vy < 0, (bottom - scale - y) / vy, np.inf))
+    return np.maximum(np.minimum(tx, ty), 0.0)
+
+class ShapeField:
+    ## Every moving shape stored as columns of numpy arrays (structure of arrays).
+    ## Shapes live in slots, a dead slot is reused by the next spawn.
+    def __init__(self, width, height, capacity=64, rng=None):
+        self.width = width
+        self.height = height
+        self.rng = rng if rng is not None else np.random.default_rng()
+
+        ## difficulty, (min, max) of the spawned shapes
+        self.speed_range = (35, 120) #pixels per second
+        self.scale_range = (200, width/3)
+
+        ## bounding boxes (center +- scale) of the live shapes, for callers making many point
+        ## queries at once. Brought up to date by the first query after the shapes moved
+        self.grid = SpatialGrid(self.cull_rect(), capacity=capacity, columns=(0, 1, 3), width=4)
+        self.grid_stale = False
+
+        ## shapes move in straight lines, so the time each one leaves the cull rect is known
+        ## when it spawns: (deadline, slot) min heap, and the slots it frees for the next spawns
+        self.time = 0.0
+        self.last_delta_time = 0.0
+        self.deadlines = []
+        self.free = []
+
+        self.count = 0
+        self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        old = getattr(self, 'alive', None)
+        start = 0 if old is None else len(old)
+
+        ## x, y, angle, scale: same layout as the renderer's instance buffer
+        instances = np.zeros((capacity, 4), dtype=np.float32)
+        vel = np.zeros((capacity, 2), dtype=np.float32)
+        rot = np.zeros((capacity, 2), dtype=np.float32) ## cos(angle), sin(angle)
+        kind = np.zeros(capacity, dtype=np.int8)
+        alive = np.zeros(capacity, dtype=bool)
+
+        if old is not None:
+            n = len(old)
+            instances[:n] = self.instances
+            vel[:n] = self.vel
+            rot[:n] = self.rot
+            kind[:n] = self.kind
+            alive[:n] = self.alive
+
+        self.instances = instances
+        self.vel = vel
+        self.rot = rot
+        self.kind = kind
+        self.alive = alive
+        self.grid.resize(capacity)
+
+        ## lowest slots first
+        self.free[:0] = range(capacity - 1, start - 1, -1)
+
+    @property
+    def capacity(self):
+        return len(self.alive)
+
+    @property
+    def x(self):
+        return self.instances[:, 0]
+
+    @property
+    def y(self):
+        return self.instances[:, 1]
+
+    @property
+    def angle(self):
+        return self.instances[:, 2]
+
+    @property
+    def scale(self):
+        return self.instances[:, 3]
+
+    def __len__(self):
+        return self.count
+
+    def clear(self):
+        self.alive[:] = False
+        self.grid.clear()
+        self.deadlines.clear()
+        self.free[:] = range(self.capacity - 1, -1, -1)
+        self.count = 0
+
+    def spawn(self, n=1):
+        if n <= 0: return
+
+        if len(self.free) < n:
+            capacity = self.capacity
+            while capacity - self.count < n:
+                capacity *= 2
+            self._allocate(capacity)
+        slots = np.array([self.free.pop() for _ in range(n)], dtype=np.intp)
+
+        x, y, angle, scale, dir, speed, kind = random_shapes(
+            self.rng, n, self.width, self.height, self.speed_range, self.scale_range)
+
+        self.instances[slots, 0] = x
+        self.instances[slots, 1] = y
+        self.instances[slots, 2] = angle
+        self.instances[slots, 3] = scale
+        self.vel[slots, 0] = np.cos(dir) * speed
+        self.vel[slots, 1] = np.sin(dir) * speed
+        self.rot[slots, 0] = np.cos(angle)
+        self.rot[slots, 1] = np.sin(angle)
+        self.kind[slots] = kind
+        self.alive[slots] = True
+        self.grid.insert(slots, self.instances)
+        self.count += n
+
+        deadlines = self.time + self.exit_time(slots)
+        for deadline, slot in zip(deadlines.tolist(), slots.tolist()):
+            heapq.heappush(self.deadlines, (deadline, slot))
+
+    def advance(self, delta_time):
+        ## dead slots move too, it's cheaper than masking
+        self.instances[:, :2] += self.vel * delta_time
+        self.grid_stale = True
+        self.time += delta_time
+        self.last_delta_time = delta_time
+
+    def cull_rect(self):
+        ## (left, bottom, right, top) a shape must overlap to stay alive
+        margin = self.width * 3/4
+        return (-margin, -margin, margin + self.width, margin + self.height)
+
+    def exit_time(self, slots):
+        ## seconds until the shapes in `slots` are fully outside the cull rect, at their velocity
+        return exit_time(self.x[slots], self.y[slots], self.scale[slots],
+            self.vel[slots, 0], self.vel[slots, 1], self.cull_rect())
+
+    def cull(self):
+        ## removes the shapes whose deadline passed, without looking at the others
+        deadlines = self.deadlines
+        if not deadlines or deadlines[0][0] >= self.time: return
+
+        dead = []
+        while deadlines and deadlines[0][0] < self.time:
+            dead.append(heapq.heappop(deadlines)[1])
+
+        slots = np.array(dead, dtype=np.intp)
+        self.alive[slots] = False
+        self.grid.remove(slots)
+        self.count -= len(dead)
+        self.free.extend(reversed(dead))
+
+    def update_grid(self):
+        if self.grid_stale:
+            self.grid.update(self.instances)
+            self.grid_stale = False
+
+    def query_point(self, px, py):
+        ## slots of the live shapes that may cover the point
+        self.update_grid()
+        return self.grid.query_point(px, py)
+
+    def query_circle(self, px, py, radius):
+        self.update_grid()
+        return self.grid.query_circle(px, py, radius)
+
+    def instances_of(self, kind, alpha=1.0):
+        ## packed x, y, angle, scale rows of the live shapes of this kind, at alpha (0 -> 1)
+        ## of the way from the previous advance() to the last one
+        mask = self.alive & (self.kind == kind)
+        instances = self.instances[mask]
+        if alpha < 1.0:
+            instances[:, :2] -= self.vel[mask] * ((1.0 - alpha) * self.last_delta_time)
+        return instances
@@ -1,8 +1,26 @@
-from math import radians, cos, sin
+from array import array
+from math import pi
+import numpy as np
+
+## Static geometry as packed float32 arrays (array('f')), built once and cached.
+## A disk of radius r drawn with n segments is off by its sagitta r * (1 - cos(pi / n)),
+## disks get the fewest segments keeping that under DISK_MAX_ERROR pixels.
+
+DISK_LEVELS = (8, 12, 16, 24, 32, 48, 64, 96, 128, 192, 256) ## segments of each level of detail
+MAX_DISK_SEGMENTS = 128
+DISK_MAX_ERROR = 0.5 ## pixels
+
+_cache = {}
+
+def _cached(key, build):
+    vertices = _cache.get(key)
+    if vertices is None:
+        vertices = _cache[key] = build()
+    return vertices
 
 class ShapeBuilder:
     def quad():
-        vertices = [
+        return _cached('quad', lambda: array('f', [
             -0.5, 0.5,
             -0.5, -0.5,
             0.5, -0.5,
@@ -10,17 +28,27 @@ class ShapeBuilder:
             0.5, -0.5,
             0.5, 0.5,
             -0.5, 0.5,
-        ]
-        return vertices
+        ]))
 
-    def disk(n=128):
-        vertices = []
+    def disk(n=MAX_DISK_SEGMENTS):
+        ## unit circle as a triangle fan of n segments
+        def build():
+            angles = np.arange(n) * (2.0 * pi / n)
+            vertices = np.empty((n, 2), dtype=np.float32)
+            vertices[:, 0] = np.cos(angles)
+            vertices[:, 1] = np.sin(angles)
+            return array('f', vertices.tobytes())
+        return _cached(('disk', n), build)
 
-        inc = radians(360.0 / n)
+    def disk_quad():
+        ## square around the unit circle, the fragment shader (disk.frag) discards its corners
+        return _cached('disk_quad', lambda: array('f', [v * 2.0 for v in ShapeBuilder.quad()]))
 
-        for i in range(n):
-            x = cos(inc * i)
-            y = sin(inc * i)
-            vertices.extend((x, y))
+    def disk_levels(max_segments=MAX_DISK_SEGMENTS):
+        levels = tuple(n for n in DISK_LEVELS if n <= max_segments)
+        return levels or DISK_LEVELS[:1]
 
-        return vertices
+    def disk_segments(radius, max_error=DISK_MAX_ERROR, max_segments=MAX_DISK_SEGMENTS):
+        ## segments needed by disks of `radius` pixels (float or array), not rounded to a level
+        radius = np.maximum(np.asarray(radius, dtype=np.float64), max_error)
+        return np.minimum(pi / np.arccos(1.0 - max_error / radius), max_segments)
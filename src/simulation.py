@@ -0,0 +1,139 @@
+import numpy as np
+from player import Player, INPUT_DASH
+from particles import ParticleSystem
+from shapefield import ShapeField
+from collision import is_lit
+
+## Whole game logic, without any window or gl context.
+## Game (main.py) only renders it and feeds it the keyboard.
+
+STATE_START = 0
+STATE_PLAYING = 1
+STATE_OVER = 2
+
+class Simulation:
+    def __init__(self, width, height, seed=None):
+        self.width = width
+        self.height = height
+
+        ## every random number of the game comes from this generator, the decorative
+        ## trail has its own one so it never shifts the shapes
+        if seed is None:
+            seed = int(np.random.SeedSequence().entropy % 2**63)
+        self.seed = seed
+        self.rng = np.random.default_rng(seed)
+        self.trail_rng = np.random.default_rng(np.random.SeedSequence(seed).spawn(1)[0])
+
+        ## Player
+        self.player = Player(x=width/2, y=height/2)
+
+        ## Dash particules trail
+        self.trailSystem = ParticleSystem(rng=self.trail_rng)
+        self.trail_rate = 60 #particles per second
+        self.time_next_particle = 0.0
+
+        ## Shapes
+        self.max_time_next_shape = 1
+        self.time_next_shape = self.max_time_next_shape
+
+        self.shapes = ShapeField(width, height, rng=self.rng)
+        self.max_shapes = 10
+        self.max_cooldown_increase_max_shapes = 2.0 #seconds
+        self.cooldown_increase_max_shapes = self.max_cooldown_increase_max_shapes
+
+        ## collision.Overlay of the white hud texts drawn under the shapes,
+        ## they count as light too
+        self.overlays = []
+
+        ## optional (px, py) -> True/False, or None when it can't tell, asked before is_lit()
+        ## like the gpu mask of lightmask.py
+        self.lit_probe = None
+
+        ## Game Logic
+        self.game_state = STATE_START
+        self.inputs = 0 ## INPUT_* flags of the last step
+        self.ticks = 0
+
+        ## HighScore
+        self.time_since_start = 0.0
+
+    def start(self):
+        self.game_state = STATE_PLAYING
+        self.shapes.clear()
+
+    def step(self, delta_time, inputs=0):
+        pressed = inputs & ~self.inputs
+        self.inputs = inputs
+        self.ticks += 1
+
+        self.player.set_inputs(inputs)
+
+        if self.game_state == STATE_START:
+            if pressed & INPUT_DASH:
+                self.start()
+            else:
+                self.update_start(delta_time)
+                return
+
+        if self.game_state != STATE_PLAYING: return
+
+        self.update_playing(delta_time)
+
+        ## Dead if on light or out of screen
+        player = self.player
+        if (not player.is_dashing and self.player_lit()) or\
+                not (0 < player.x < self.width and 0 < player.y < self.height):
+            self.game_state = STATE_OVER
+
+    def player_lit(self):
+        x, y = self.player.x, self.player.y
+        if self.lit_probe is not None:
+            lit = self.lit_probe(x, y)
+            if lit is not None:
+                return lit
+        return is_lit(x, y, self.shapes, self.overlays)
+
+    def update_start(self, delta_time):
+        ## shapes floating around the start text
+        self.shapes.cull()
+
+        self.time_next_shape -= delta_time
+        if self.time_next_shape <= 0.0:
+
+            if len(self.shapes) < 10:
+                self.shapes.spawn(n=2)
+                self.time_next_shape = self.max_time_next_shape
+
+        self.shapes.advance(delta_time)
+
+    def update_playing(self, delta_time):
+        ## add deltatime because highscore is the time you survived
+        self.time_since_start += delta_time
+
+        self.cooldown_increase_max_shapes -= delta_time
+        if self.cooldown_increase_max_shapes <= 0.0:
+            self.cooldown_increase_max_shapes = self.max_cooldown_increase_max_shapes
+            self.max_shapes += 1
+
+        self.player.update(delta_time)
+        if self.player.is_dashing:
+            self.time_next_particle -= delta_time
+            while self.time_next_particle <= 0.0:
+                self.time_next_particle += 1.0 / self.trail_rate
+                dx, dy = self.trail_rng.uniform(-1.0, 1.0, 2)
+                length = max((dx * dx + dy * dy) ** 0.5, 1e-9)
+                self.trailSystem.spawn(self.player.x + dx / length * 5.0, self.player.y + dy / length * 5.0)
+
+        self.trailSystem.update(delta_time)
+
+        ## Remove shapes that are off bounds
+        self.shapes.cull()
+
+        self.time_next_shape -= delta_time
+        if self.time_next_shape <= 0.0:
+
+            if len(self.shapes) < self.max_shapes:
+                self.shapes.spawn(n=1)
+                self.time_next_shape = self.max_time_next_shape
+
+        self.shapes.advance(delta_time)
@@ -0,0 +1,243 @@
+#! /usr/bin/python3
+
+## Software rendering of a Simulation into numpy arrays, no gpu, no window.
+##   python src/softraster.py run.lidr --thumbnail run.ppm       # last frame of a replay
+##   python src/softraster.py run.lidr --out frames/ --every 30  # one frame every 30 ticks
+##   python src/softraster.py run.lidr --check                    # raster vs collision logic
+## A pixel is lit when its center is, by the same float32 math as collision.is_lit: the
+## lit image is pixel exact with the collision test, at any scale. The hud texts are drawn
+## as the glyph masks the simulation knows them by (Simulation.overlays), white rects for
+## the ones without a mask.
+
+import argparse
+import sys
+import time
+from math import sqrt
+from pathlib import Path
+
+import numpy as np
+
+from simulation import STATE_PLAYING
+from shapefield import SHAPE_QUAD
+from collision import shape_contains, is_lit
+
+WHITE = (255, 255, 255)
+CYAN = (0, 255, 255)
+RED = (180, 0, 0)
+GREEN = (0, 180, 0)
+
+class SoftRenderer:
+    def __init__(self, width, height, scale=1.0):
+        ## width, height: size of the simulated screen, scale: pixels per screen unit
+        self.width = width
+        self.height = height
+        self.scale = scale
+        self.size = (max(1, int(width * scale)), max(1, int(height * scale)))
+        w, h = self.size
+
+        ## pixel centers in screen units: float64 like the python floats given to is_lit,
+        ## and float32 like the shape math does with them
+        self.x64 = (np.arange(w) + 0.5) / scale
+        self.y64 = (np.arange(h) + 0.5) / scale
+        self.x32 = self.x64.astype(np.float32)
+        self.y32 = self.y64.astype(np.float32)
+
+        ## rows are y going up, like gl. Flipped when written to a file
+        self.lit_buffer = np.zeros((h, w), dtype=bool)
+        self.image = np.zeros((h, w, 3), dtype=np.uint8)
+
+    def columns(self, left, right):
+        ## pixels whose center is in [left, right], left and right can be arrays
+        return np.searchsorted(self.x64, left, 'left'), np.searchsorted(self.x64, right, 'right')
+
+    def rows(self, bottom, top):
+        return np.searchsorted(self.y64, bottom, 'left'), np.searchsorted(self.y64, top, 'right')
+
+    def lit(self, shapes, overlays=()):
+        ## (h, w) bools: white overlays, each shape inverting what's under it
+        lit = self.lit_buffer
+        lit[:] = False
+
+        for overlay in overlays:
+            if overlay.mask is None:
+                left, bottom, right, top = overlay.rect
+                i0, i1 = self.columns(left, right)
+                j0, j1 = self.rows(bottom, top)
+                lit[j0:j1, i0:i1] ^= True
+                continue
+
+            ## the glyph mask sampled at the pixel centers, on the screen pixel each one falls in
+            x, y = overlay.origin
+            h, w = overlay.mask.shape
+            i0, i1 = np.searchsorted(self.x64, (x, x + w), 'left')
+            j0, j1 = np.searchsorted(self.y64, (y, y + h), 'left')
+            if i0 >= i1 or j0 >= j1: continue
+            columns = np.floor(self.x64[i0:i1]).astype(np.intp) - x
+            rows = np.floor(self.y64[j0:j1]).astype(np.intp) - y
+            lit[j0:j1, i0:i1] ^= overlay.mask[rows[:, None], columns[None, :]]
+
+        slots = np.flatnonzero(shapes.alive)
+        x, y, scale = shapes.x[slots], shapes.y[slots], shapes.scale[slots]
+        c, s, kind = shapes.rot[slots, 0], shapes.rot[slots, 1], shapes.kind[slots]
+        ## half extent of the bounding box, a quad turned 45 degrees is the widest
+        reach = np.where(kind == SHAPE_QUAD, scale * (sqrt(2.0) / 2), scale).astype(np.float64) + 1.0
+
+        ## bounding boxes of every shape in pixels, at once
+        i0s, i1s = self.columns(x - reach, x + reach)
+        j0s, j1s = self.rows(y - reach, y + reach)
+
+        for k, (i0, i1, j0, j1) in enumerate(zip(i0s.tolist(), i1s.tolist(), j0s.tolist(), j1s.tolist())):
+            if i0 >= i1 or j0 >= j1: continue
+
+            dx = self.x32[None, i0:i1] - x[k]
+            dy = self.y32[j0:j1, None] - y[k]
+            lit[j0:j1, i0:i1] ^= shape_contains(dx, dy, c[k], s[k], scale[k], kind[k])
+
+        return lit
+
+    def fill_rect(self, left, bottom, right, top, color, alpha=1.0):
+        i0, i1 = self.columns(left, right)
+        j0, j1 = self.rows(bottom, top)
+        if i0 >= i1 or j0 >= j1: return
+        region = self.image[j0:j1, i0:i1]
+        if alpha >= 1.0:
+            region[:] = color
+        else:
+            region[:] = region * (1.0 - alpha) + np.asarray(color) * alpha
+
+    def draw_points(self, xs, ys, size, color, alphas):
+        ## squares of `size` screen units, blended by alphas, like gl points
+        w, h = self.size
+        half = max(size * self.scale, 1.0) / 2
+        i0 = np.clip(np.ceil(xs * self.scale - half - 0.5), 0, w).astype(np.intp)
+        i1 = np.clip(np.ceil(xs * self.scale + half - 0.5), 0, w).astype(np.intp)
+        j0 = np.clip(np.ceil(ys * self.scale - half - 0.5), 0, h).astype(np.intp)
+        j1 = np.clip(np.ceil(ys * self.scale + half - 0.5), 0, h).astype(np.intp)
+
+        color = np.asarray(color, dtype=np.float32)
+        for k in range(len(xs)):
+            region = self.image[j0[k]:j1[k], i0[k]:i1[k]]
+            a = alphas[k]
+            region[:] = region * (1.0 - a) + color * a
+
+    def render(self, sim):
+        ## (h, w, 3) uint8 frame of the simulation, the same buffer every call
+        image = self.image
+        image[:] = 0
+        image[self.lit(sim.shapes, sim.overlays)] = WHITE
+
+        if sim.game_state != STATE_PLAYING:
+            return image
+
+        ## trail particles
+        particles = sim.trailSystem.data
+        live = particles[particles[:, 2] > 0.0]
+        if len(live):
+            self.draw_points(live[:, 0], live[:, 1], 3, CYAN, np.clip(live[:, 2], 0.0, 1.0))
+
+        ## player and its dash cooldown
+        player = sim.player
+        if player.is_dashing:
+            color = CYAN
+        else:
+            color = RED if player.dash_cooldown > 0 else GREEN
+        self.draw_points(np.array([player.x]), np.array([player.y]), player.scale, color, np.ones(1))
+
+        if player.dash_cooldown > 0:
+            width = 40 * (1.0 - player.dash_cooldown / player.max_dash_cooldown)
+            y = player.y + 20
+            self.fill_rect(player.x - width / 2, y - 2.5, player.x + width / 2, y + 2.5, CYAN)
+
+        return image
+
+    def check(self, sim, radius=2):
+        ## compares the lit image with collision.is_lit at the pixel centers around the player,
+        ## returns the number of pixels that disagree
+        lit = self.lit(sim.shapes, sim.overlays)
+        w, h = self.size
+        i = min(max(int(sim.player.x * self.scale), 0), w - 1)
+        j = min(max(int(sim.player.y * self.scale), 0), h - 1)
+
+        mismatches = 0
+        for jj in range(max(j - radius, 0), min(j + radius + 1, h)):
+            for ii in range(max(i - radius, 0), min(i + radius + 1, w)):
+                expected = is_lit(float(self.x64[ii]), float(self.y64[jj]), sim.shapes, sim.overlays)
+                mismatches += bool(lit[jj, ii]) != expected
+        return mismatches
+
+## Files, binary netpbm: no dependency, any image viewer opens them
+
+def write_ppm(path, image):
+    ## (h, w, 3) uint8, rows going up
+    h, w = image.shape[:2]
+    with open(path, 'wb') as f:
+        f.write(b'P6\n%d %d\n255\n' % (w, h))
+        f.write(np.ascontiguousarray(image[::-1]).tobytes())
+
+def write_pgm(path, image):
+    ## (h, w) uint8 or bools, rows going up
+    if image.dtype == bool:
+        image = image.astype(np.uint8) * 255
+    h, w = image.shape[:2]
+    with open(path, 'wb') as f:
+        f.write(b'P5\n%d %d\n255\n' % (w, h))
+        f.write(np.ascontiguousarray(image[::-1]).tobytes())
+
+def read_netpbm(path):
+    ## back to the arrays given to write_ppm/write_pgm, for golden images
+    with open(path, 'rb') as f:
+        data = f.read()
+    magic, w, h, maxval = data.split(maxsplit=4)[:4]
+    if magic not in (b'P5', b'P6') or maxval != b'255':
+        raise ValueError("{} is not a binary 8 bits ppm/pgm".format(path))
+    w, h = int(w), int(h)
+    channels = 3 if magic == b'P6' else 1
+    pixels = np.frombuffer(data[len(data) - w * h * channels:], dtype=np.uint8)
+    return pixels.reshape((h, w, 3) if channels == 3 else (h, w))[::-1]
+
+def main():
+    from replay import Recording, frames
+
+    parser = argparse.ArgumentParser(description="Light is death software renderer")
+    parser.add_argument("recording")
+    parser.add_argument("--scale", type=float, default=0.25, help="pixels per screen pixel (default: %(default)s)")
+    parser.add_argument("--every", type=int, default=0, help="render one frame every N ticks (default: only the last one)")
+    parser.add_argument("--out", help="directory the rendered frames are written to, as .ppm")
+    parser.add_argument("--thumbnail", help="write the last frame to this .ppm")
+    parser.add_argument("--check", action="store_true", help="check the raster against the collision test on every rendered frame")
+    args = parser.parse_args()
+
+    recording = Recording.load(args.recording)
+    renderer = SoftRenderer(recording.width, recording.height, args.scale)
+    if args.out:
+        Path(args.out).mkdir(parents=True, exist_ok=True)
+
+    rendered = 0
+    mismatches = 0
+    render_time = 0.0
+    for tick, sim in enumerate(frames(recording), 1):
+        if not (args.every and tick % args.every == 0 or tick >= recording.ticks):
+            continue
+
+        t = time.perf_counter()
+        image = renderer.render(sim)
+        render_time += time.perf_counter() - t
+        rendered += 1
+
+        if args.out:
+            write_ppm(Path(args.out) / "frame_{:06d}.ppm".format(tick), image)
+        if args.check:
+            mismatches += renderer.check(sim)
+
+    if args.thumbnail:
+        write_ppm(args.thumbnail, image)
+
+    w, h = renderer.size
+    print("{} frames of {}x{} in {:.3f}s ({:.0f} frames/s)".format(
+        rendered, w, h, render_time, rendered / max(render_time, 1e-9)))
+    if args.check:
+        print("collision check: {} pixels disagree".format(mismatches))
+        sys.exit(1 if mismatches else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+import numpy as np
+from math import ceil, floor
+
+class SpatialGrid:
+    ## Dense uniform grid over the bounds (left, bottom, right, top), indexing the bounding
+    ## boxes (center +- radius) of slots. Membership is a (cells, slots) boolean table, a slot
+    ## is only rewritten when its box starts to overlap another range of cells.
+    ## Anything beyond the bounds is clamped into the border cells.
+    ## The slots are rows of an array holding x, y and the radius at `columns`.
+    def __init__(self, bounds, cell_size=512, capacity=64, columns=(0, 1, 2), width=3):
+        left, bottom, right, top = bounds
+        self.origin = (left, bottom)
+        self.cell_size = cell_size
+        self.nx = max(1, ceil((right - left) / cell_size))
+        self.ny = max(1, ceil((top - bottom) / cell_size))
+
+        ## rows @ to_cells + offset = [x - r, y - r, x + r, y + r] in cells
+        x, y, r = columns
+        inv = 1.0 / cell_size
+        self.to_cells = np.zeros((width, 4), dtype=np.float32)
+        self.to_cells[x, [0, 2]] = inv
+        self.to_cells[y, [1, 3]] = inv
+        self.to_cells[r] = (-inv, -inv, inv, inv)
+        self.offset = np.array([-left, -bottom, -left, -bottom], dtype=np.float32) * inv
+
+        self.members = np.zeros((self.ny * self.nx, capacity), dtype=bool)
+        self.ranges = np.zeros((capacity, 4), dtype=np.float32) ## [cx0, cy0, cx1, cy1], inclusive
+        self.present = np.zeros(capacity, dtype=bool)
+        self._scratch = np.zeros((capacity, 4), dtype=np.float32)
+
+    def resize(self, capacity):
+        n = min(capacity, len(self.present))
+        for name in ('ranges', 'present', '_scratch'):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:n] = old[:n]
+            setattr(self, name, new)
+
+        members = np.zeros((len(self.members), capacity), dtype=bool)
+        members[:, :n] = self.members[:, :n]
+        self.members = members
+
+    def clear(self):
+        self.members[:] = False
+        self.present[:] = False
+
+    def _ranges(self, rows):
+        ## cells covered by every row, not clamped
+        out = self._scratch
+        np.matmul(rows, self.to_cells, out=out)
+        np.add(out, self.offset, out=out)
+        np.floor(out, out=out)
+        return out
+
+    def _write(self, slots, ranges):
+        ## membership columns of the slots, from their cell ranges
+        cx = np.arange(self.nx)
+        cy = np.arange(self.ny)
+        cx0 = np.minimum(ranges[:, 0, None], self.nx - 1)
+        cy0 = np.minimum(ranges[:, 1, None], self.ny - 1)
+        cx1 = np.maximum(ranges[:, 2, None], 0)
+        cy1 = np.maximum(ranges[:, 3, None], 0)
+        in_x = (cx0 <= cx) & (cx <= cx1)
+        in_y = (cy0 <= cy) & (cy <= cy1)
+        mask = in_y[:, :, None] & in_x[:, None, :]
+        self.members[:, slots] = mask.reshape(len(slots), -1).T
+
+    def insert(self, slots, rows):
+        ranges = self._ranges(rows)[slots]
+        self._write(slots, ranges)
+        self.ranges[slots] = ranges
+        self.present[slots] = True
+
+    def remove(self, slots):
+        self.members[:, slots] = False
+        self.present[slots] = False
+
+    def update(self, rows):
+        ## only the slots that changed cells are rewritten
+        ranges = self._ranges(rows)
+        ## compares the 4 floats of a range at once
+        changed = ranges.view(np.complex128).ravel() != self.ranges.view(np.complex128).ravel()
+        changed &= self.present
+        if not changed.any(): return
+
+        slots = np.flatnonzero(changed)
+        self._write(slots, ranges[slots])
+        self.ranges[slots] = ranges[slots]
+
+    def cell_of(self, px, py):
+        c = self.cell_size
+        cx = floor((px - self.origin[0]) / c)
+        cy = floor((py - self.origin[1]) / c)
+        return (min(max(cx, 0), self.nx - 1), min(max(cy, 0), self.ny - 1))
+
+    def query_point(self, px, py):
+        ## slots whose box may contain the point
+        cx, cy = self.cell_of(px, py)
+        return np.flatnonzero(self.members[cy * self.nx + cx])
+
+    def query_circle(self, px, py, radius):
+        ## slots whose box may overlap the circle
+        cx0, cy0 = self.cell_of(px - radius, py - radius)
+        cx1, cy1 = self.cell_of(px + radius, py + radius)
+        rows = (np.arange(cy0, cy1 + 1)[:, None] * self.nx + np.arange(cx0, cx1 + 1)).ravel()
+        return np.flatnonzero(self.members[rows].any(axis=0))
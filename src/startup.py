@@ -0,0 +1,78 @@
+import os
+import sys
+import time
+
+## Startup timings, from the launch of the process to the first frame drawn.
+##   python src/main.py --startup-report
+##   python -X importtime src/main.py 2> imports.txt     # every import, nested, in microseconds
+## main.py marks each step as it goes, report() gives how long each one took. What ran before
+## main.py (the interpreter starting, and the unpacking of a pyinstaller --onefile build, done
+## by a first process before it starts the game in a second one) is read from the os when it can be.
+
+_wall = time.time() - time.perf_counter() ## time.time() of perf_counter() 0
+_marks = [("main.py", time.perf_counter())] ## (name, perf_counter()), in order
+
+def mark(name):
+    ## the step `name` is done
+    _marks.append((name, time.perf_counter()))
+
+def process_start(pid=None):
+    ## time.time() the process was started at, None when the os doesn't tell
+    pid = os.getpid() if pid is None else pid
+    try:
+        if sys.platform.startswith('linux'):
+            ## clock ticks after boot, compared with the uptime: no need for the boot time
+            with open('/proc/{}/stat'.format(pid)) as f:
+                started = int(f.read().rsplit(')', 1)[1].split()[19]) / os.sysconf('SC_CLK_TCK')
+            with open('/proc/uptime') as f:
+                uptime = float(f.read().split()[0])
+            return time.time() - (uptime - started)
+
+        if sys.platform == 'win32':
+            import ctypes
+            from ctypes import wintypes
+            kernel32 = ctypes.windll.kernel32
+            handle = kernel32.OpenProcess(0x1000, False, pid) ## PROCESS_QUERY_LIMITED_INFORMATION
+            if not handle: return None
+            times = [wintypes.FILETIME() for _ in range(4)]
+            ok = kernel32.GetProcessTimes(handle, *[ctypes.byref(t) for t in times])
+            kernel32.CloseHandle(handle)
+            if not ok: return None
+            ## 100ns since 1601
+            created = times[0].dwHighDateTime << 32 | times[0].dwLowDateTime
+            return (created - 116444736000000000) / 1e7
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    return None
+
+def bootloader_start():
+    ## start of the process which unpacked a pyinstaller --onefile build, None when not one
+    ## --onedir builds run from their own directory, --onefile ones from a temporary _MEIxxxxxx
+    if not os.path.basename(getattr(sys, '_MEIPASS', '')).startswith('_MEI'): return None
+    return process_start(os.getppid())
+
+def report():
+    ## lines, one per step and its duration, the total first
+    lines = []
+    steps = []
+    main_start = _wall + _marks[0][1]
+
+    process = process_start()
+    launch = bootloader_start()
+    if process is not None and process <= main_start:
+        if launch is not None and launch <= process:
+            steps.append(("unpack (onefile)", process - launch))
+        else:
+            launch = process
+        steps.append(("interpreter", main_start - process))
+    else:
+        launch = main_start
+
+    for (_, previous), (name, t) in zip(_marks, _marks[1:]):
+        steps.append((name, t - previous))
+
+    total = _wall + _marks[-1][1] - launch
+    lines.append("startup: {:.0f}ms from launch to {}".format(total * 1000, _marks[-1][0]))
+    for name, duration in steps:
+        lines.append("  {:<18} {:7.1f}ms".format(name, duration * 1000))
+    return lines
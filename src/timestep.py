@@ -0,0 +1,36 @@
+## Fixed rate simulation clock: frames add their real duration to an accumulator and
+## the simulation steps by a constant dt as many times as it holds, whatever the
+## display refresh rate. What is left (alpha, 0 -> 1) interpolates the drawing
+## between the last two steps.
+
+TICK_RATE = 120 #steps per second
+
+class FixedTimestep:
+    def __init__(self, rate=TICK_RATE, max_steps=8):
+        self.rate = rate
+        self.dt = 1.0 / rate
+        ## after a long frame (loading, window dragged...) the game slows down
+        ## instead of running hundreds of steps to catch up
+        self.max_steps = max_steps
+        self.accumulator = 0.0
+        self.dropped = 0.0 #seconds not simulated
+
+    def reset(self):
+        self.accumulator = 0.0
+
+    def advance(self, frame_time):
+        ## returns how many steps to run for this frame
+        self.accumulator += frame_time
+        ## a 60Hz frame is exactly 2 steps at 120Hz, not 1.9999
+        steps = int(self.accumulator * self.rate + 1e-6)
+        if steps > self.max_steps:
+            self.dropped += self.accumulator - self.max_steps * self.dt
+            self.accumulator = self.max_steps * self.dt
+            steps = self.max_steps
+
+        self.accumulator = max(0.0, self.accumulator - steps * self.dt)
+        return steps
+
+    @property
+    def alpha(self):
+        return min(self.accumulator * self.rate, 1.0)
@@ -0,0 +1,316 @@
+#! /usr/bin/python3
+
+## N independent games stepped in lockstep, every state as (N, ...) numpy arrays.
+## Same rules, same random draws and same float precision as Simulation: an env
+## seeded like a Simulation and given the same inputs dies on the same tick.
+## The trail particles are not simulated, they have their own generator.
+##   python src/vecsim.py runs/*.lidr        # validate many recordings at once
+
+import sys
+import time
+
+import numpy as np
+
+from simulation import Simulation, STATE_START, STATE_PLAYING, STATE_OVER
+from player import INPUT_UP, INPUT_DOWN, INPUT_LEFT, INPUT_RIGHT, INPUT_DASH
+from shapefield import random_shapes, exit_time
+from collision import shape_contains
+
+class VecSimulation:
+    def __init__(self, n, width, height, seeds=None, capacity=16):
+        self.n = n
+        self.width = width
+        self.height = height
+
+        if seeds is None:
+            seeds = [int(np.random.SeedSequence().entropy % 2**63) for _ in range(n)]
+        self.seeds = list(seeds)
+        ## one generator per env, drawn from in the same order as Simulation.rng
+        self.rngs = [np.random.default_rng(seed) for seed in self.seeds]
+
+        ## the defaults of a Simulation, difficulty included
+        sim = Simulation(width, height, seed=0)
+        self.cull_rect = sim.shapes.cull_rect()
+        self.speed_range = sim.shapes.speed_range
+        self.scale_range = sim.shapes.scale_range
+        self.max_time_next_shape = sim.max_time_next_shape
+        self.max_cooldown_increase_max_shapes = sim.max_cooldown_increase_max_shapes
+
+        player = sim.player
+        self.player_speed = player.speed
+        self.dash_mult = player.dash_mult
+        self.max_dash_cooldown = player.max_dash_cooldown
+        self.dash_stamina_drain = player.dash_stamina_drain
+
+        ## Games
+        self.game_state = np.full(n, STATE_START, dtype=np.int8)
+        self.inputs = np.zeros(n, dtype=np.uint8)
+        self.ticks = np.zeros(n, dtype=np.int64)
+        self.time_since_start = np.zeros(n)
+        self.time_next_shape = np.full(n, float(sim.time_next_shape))
+        self.max_shapes = np.full(n, sim.max_shapes, dtype=np.int64)
+        self.cooldown_increase_max_shapes = np.full(n, sim.cooldown_increase_max_shapes)
+        ## collision.Overlay per env, and their bounds (left, bottom, right, top) padded with nan
+        self.overlay_lists = [[] for _ in range(n)]
+        self.overlays = np.full((n, 0, 4), np.nan)
+
+        ## Players
+        self.pos = np.tile([player.x, player.y], (n, 1))
+        self.vel = np.zeros((n, 2))
+        self.is_dashing = np.zeros(n, dtype=bool)
+        self.dash_cooldown = np.full(n, player.dash_cooldown)
+        self.dash_stamina = np.full(n, player.dash_stamina)
+
+        ## Shapes, (n, slots), float32 like ShapeField
+        self.time = np.zeros(n) ## ShapeField.time
+        self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        old = getattr(self, 'alive', None)
+        n = self.n
+
+        shape_pos = np.zeros((n, capacity, 2), dtype=np.float32)
+        shape_vel = np.zeros((n, capacity, 2), dtype=np.float32)
+        rot = np.zeros((n, capacity, 2), dtype=np.float32)
+        scale = np.zeros((n, capacity), dtype=np.float32)
+        kind = np.zeros((n, capacity), dtype=np.int8)
+        alive = np.zeros((n, capacity), dtype=bool)
+        deadline = np.full((n, capacity), np.inf)
+
+        if old is not None:
+            k = old.shape[1]
+            shape_pos[:, :k] = self.shape_pos
+            shape_vel[:, :k] = self.shape_vel
+            rot[:, :k] = self.rot
+            scale[:, :k] = self.scale
+            kind[:, :k] = self.kind
+            alive[:, :k] = self.alive
+            deadline[:, :k] = self.deadline
+
+        self.shape_pos = shape_pos
+        self.shape_vel = shape_vel
+        self.rot = rot
+        self.scale = scale
+        self.kind = kind
+        self.alive = alive
+        self.deadline = deadline
+
+    @property
+    def done(self):
+        return self.game_state == STATE_OVER
+
+    def shape_counts(self):
+        return np.count_nonzero(self.alive, axis=1)
+
+    def set_overlays(self, env, overlays):
+        ## collision.Overlay of an env, their bounds kept as an array to test every env at once
+        self.overlay_lists[env] = list(overlays)
+        bounds = np.asarray([overlay.bounds() for overlay in overlays], dtype=np.float64).reshape(-1, 4)
+        if len(bounds) > self.overlays.shape[1]:
+            grown = np.full((self.n, len(bounds), 4), np.nan)
+            grown[:, :self.overlays.shape[1]] = self.overlays
+            self.overlays = grown
+        self.overlays[env] = np.nan
+        self.overlays[env, :len(bounds)] = bounds
+
+    ## Shapes
+
+    def spawn(self, env, n):
+        ## same draws and same float32 rounding as ShapeField.spawn
+        free = np.flatnonzero(~self.alive[env])
+        if len(free) < n:
+            self._allocate(self.alive.shape[1] * 2)
+            free = np.flatnonzero(~self.alive[env])
+        slots = free[:n]
+
+        x, y, angle, scale, dir, speed, kind = random_shapes(
+            self.rngs[env], n, self.width, self.height, self.speed_range, self.scale_range)
+
+        self.shape_pos[env, slots, 0] = x
+        self.shape_pos[env, slots, 1] = y
+        self.scale[env, slots] = scale
+        self.shape_vel[env, slots, 0] = np.cos(dir) * speed
+        self.shape_vel[env, slots, 1] = np.sin(dir) * speed
+        self.rot[env, slots, 0] = np.cos(angle)
+        self.rot[env, slots, 1] = np.sin(angle)
+        self.kind[env, slots] = kind
+        self.alive[env, slots] = True
+
+        pos, vel = self.shape_pos[env, slots], self.shape_vel[env, slots]
+        self.deadline[env, slots] = self.time[env] + exit_time(
+            pos[:, 0], pos[:, 1], self.scale[env, slots], vel[:, 0], vel[:, 1], self.cull_rect)
+
+    def cull(self, envs):
+        expired = self.alive & (self.deadline < self.time[:, None]) & envs[:, None]
+        self.alive &= ~expired
+        self.deadline[expired] = np.inf
+
+    def spawn_timers(self, envs, delta_time, max_shapes):
+        ## envs whose spawn timer ran out, and that have room for more shapes
+        self.time_next_shape[envs] -= delta_time[envs]
+        ready = envs & (self.time_next_shape <= 0.0) & (self.shape_counts() < max_shapes)
+        self.time_next_shape[ready] = self.max_time_next_shape
+        return np.flatnonzero(ready)
+
+    def advance(self, envs, delta_time):
+        self.shape_pos[envs] += self.shape_vel[envs] * delta_time[envs, None, None].astype(np.float32)
+        self.time[envs] += delta_time[envs]
+
+    ## Players
+
+    def update_players(self, envs, delta_time, inputs):
+        dash = (inputs & INPUT_DASH) != 0
+        moving = np.sqrt(self.vel[:, 0] ** 2 + self.vel[:, 1] ** 2) > 0
+        self.is_dashing |= envs & dash & (self.dash_cooldown <= 0) & moving
+
+        dashing = envs & self.is_dashing
+        resting = envs & ~self.is_dashing
+        self.dash_cooldown[dashing] = self.max_dash_cooldown
+        self.dash_stamina[dashing] = np.maximum(0, self.dash_stamina[dashing] - self.dash_stamina_drain * delta_time[dashing])
+        self.dash_stamina[resting] = 1.0
+        self.dash_cooldown[resting] = np.maximum(0, self.dash_cooldown[resting] - delta_time[resting])
+
+        self.is_dashing &= ~envs | dash
+
+        walking = envs & ~self.is_dashing
+        vx = ((inputs & INPUT_RIGHT) != 0).astype(np.float64) - ((inputs & INPUT_LEFT) != 0)
+        vy = ((inputs & INPUT_UP) != 0).astype(np.float64) - ((inputs & INPUT_DOWN) != 0)
+        self.vel[walking, 0] = vx[walking]
+        self.vel[walking, 1] = vy[walking]
+
+        length = np.sqrt(self.vel[:, 0] ** 2 + self.vel[:, 1] ** 2)
+        normalize = envs & (length > 0.001)
+        self.vel[normalize] /= length[normalize, None]
+        self.vel[envs & self.is_dashing] *= self.dash_mult
+
+        self.pos[envs] += self.vel[envs] * self.player_speed * delta_time[envs, None]
+
+    def lit(self, envs):
+        ## analytic is_lit of every player, over all the slots
+        px = self.pos[:, 0]
+        py = self.pos[:, 1]
+
+        ## same float32 math as is_lit with a python float
+        dx = px.astype(np.float32)[:, None] - self.shape_pos[:, :, 0]
+        dy = py.astype(np.float32)[:, None] - self.shape_pos[:, :, 1]
+        inside = self.alive & shape_contains(dx, dy, self.rot[:, :, 0], self.rot[:, :, 1], self.scale, self.kind)
+        parity = np.count_nonzero(inside, axis=1) % 2 == 1
+
+        overlays = self.overlays
+        if overlays.shape[1]:
+            with np.errstate(invalid='ignore'):
+                inside = (overlays[:, :, 0] <= px[:, None]) & (px[:, None] <= overlays[:, :, 2]) &\
+                    (overlays[:, :, 1] <= py[:, None]) & (py[:, None] <= overlays[:, :, 3])
+            ## the glyphs only where a player is in the bounds of a text, rarely
+            for env, k in zip(*(axis.tolist() for axis in np.nonzero(inside))):
+                inside[env, k] = self.overlay_lists[env][k].contains(float(px[env]), float(py[env]))
+            parity ^= np.count_nonzero(inside, axis=1) % 2 == 1
+
+        return envs & parity
+
+    ## Step
+
+    def step(self, delta_time, inputs):
+        ## delta_time: float or (n,), inputs: (n,) INPUT_* flags
+        delta_time = np.broadcast_to(np.asarray(delta_time, dtype=np.float64), (self.n,))
+        inputs = np.asarray(inputs, dtype=np.uint8)
+        pressed = inputs & ~self.inputs
+        self.inputs = inputs.copy()
+        self.ticks += 1
+
+        ## start screen: shapes floating around, SPACE starts the game
+        starting = (self.game_state == STATE_START) & ((pressed & INPUT_DASH) != 0)
+        waiting = (self.game_state == STATE_START) & ~starting
+        if starting.any():
+            self.game_state[starting] = STATE_PLAYING
+            self.alive[starting] = False
+            self.deadline[starting] = np.inf
+
+        if waiting.any():
+            self.cull(waiting)
+            for env in self.spawn_timers(waiting, delta_time, 10).tolist():
+                self.spawn(env, 2)
+            self.advance(waiting, delta_time)
+
+        playing = self.game_state == STATE_PLAYING
+        if not playing.any(): return
+
+        self.time_since_start[playing] += delta_time[playing]
+
+        self.cooldown_increase_max_shapes[playing] -= delta_time[playing]
+        ramp = playing & (self.cooldown_increase_max_shapes <= 0.0)
+        self.cooldown_increase_max_shapes[ramp] = self.max_cooldown_increase_max_shapes
+        self.max_shapes[ramp] += 1
+
+        self.update_players(playing, delta_time, inputs)
+
+        self.cull(playing)
+        for env in self.spawn_timers(playing, delta_time, self.max_shapes).tolist():
+            self.spawn(env, 1)
+        self.advance(playing, delta_time)
+
+        ## Dead if on light or out of screen
+        x, y = self.pos[:, 0], self.pos[:, 1]
+        offscreen = ~((0 < x) & (x < self.width) & (0 < y) & (y < self.height))
+        dead = playing & ((~self.is_dashing & self.lit(playing)) | offscreen)
+        self.game_state[dead] = STATE_OVER
+
+def replay_batch(recordings):
+    ## re-simulates many recordings at once, returns the replayed scores and whether each one matches
+    n = len(recordings)
+    vec = VecSimulation(n, recordings[0].width, recordings[0].height, seeds=[r.seed for r in recordings])
+    if any((r.width, r.height) != (vec.width, vec.height) for r in recordings):
+        raise ValueError("recordings of different screen sizes can't be replayed together")
+
+    ticks = np.array([r.ticks for r in recordings])
+    dts = np.zeros((n, int(ticks.max(initial=0))))
+    for i, recording in enumerate(recordings):
+        dts[i, :recording.ticks] = np.frombuffer(recording.dts, dtype=np.float64)
+
+    ## events as (tick, env, value), in tick order
+    events = sorted(
+        [(tick, i, 0, inputs) for i, r in enumerate(recordings) for tick, inputs in r.input_events] +
+        [(tick, i, 1, overlays) for i, r in enumerate(recordings) for tick, overlays in r.overlay_events],
+        key=lambda event: event[:3])
+
+    inputs = np.zeros(n, dtype=np.uint8)
+    e = 0
+    for tick in range(dts.shape[1]):
+        while e < len(events) and events[e][0] == tick:
+            _, env, what, value = events[e]
+            if what == 0:
+                inputs[env] = value
+            else:
+                vec.set_overlays(env, value)
+            e += 1
+
+        ## finished recordings stop there
+        over = tick >= ticks
+        if over.any():
+            vec.game_state[over] = STATE_OVER
+        vec.step(dts[:, tick], inputs)
+
+    scores = vec.time_since_start
+    return scores, scores == np.array([r.score for r in recordings])
+
+def main():
+    from replay import Recording
+
+    if len(sys.argv) < 2:
+        print("usage: vecsim.py <recording>...")
+        sys.exit(2)
+
+    recordings = [Recording.load(path) for path in sys.argv[1:]]
+
+    t = time.perf_counter()
+    scores, valid = replay_batch(recordings)
+    elapsed = time.perf_counter() - t
+
+    for path, recording, score, ok in zip(sys.argv[1:], recordings, scores, valid):
+        print("{} {} | recorded {:.3f} | replayed {:.3f}".format("OK     " if ok else "INVALID", path, recording.score, score))
+    ticks = sum(r.ticks for r in recordings)
+    print("{} recordings, {} ticks in {:.2f}s ({:.0f} ticks/s)".format(len(recordings), ticks, elapsed, ticks / max(elapsed, 1e-9)))
+    sys.exit(0 if valid.all() else 1)
+
+if __name__ == "__main__":
+    main()